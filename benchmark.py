@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Performance benchmark of the algorithm wrappers and the evaluation on a small fixed dataset.
+
+Every algorithm wrapper and eval.py run from scratch on the benchmark dataset, the wall time, throughput, peak
+memory of the largest process and the per-stage latencies from the wrappers' timings.csv are compared with a stored
+baseline recorded for the same algorithms, dataset and settings.
+A metric that got slower (or larger) than the baseline by more than the margin is reported as a regression.
+With --approximate, the classical algorithms also run with the approximate FLANN matcher, which is compared
+with the exact matcher by the share of exact matches it finds (recall), its throughput and the MMA and HEA.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import numpy as np
+from utils.Algorithm_Wrappers.common.timing import STAGES, load_timings
+from utils.Algorithm_Wrappers.common.pair_index import read_pairs, pair_output_path
+from utils.Datasets.synthetic_hpatches import generate_dataset
+
+APPROXIMATE_ALGORITHMS = ['akaze', 'kaze', 'orb', 'sift', 'surf']
+
+
+def make_subset(dataset_dir, subset_dir, num_sequences):
+    """
+    Copies the first num_sequences sequences of every subset (illumination, viewpoint) with their image pairs,
+    an existing subset is reused. Returns the number of image pairs.
+    """
+    if not os.path.exists(subset_dir + '/' + 'image_pairs.txt'):
+        pairs = read_pairs(dataset_dir + '/' + 'image_pairs.txt')
+        sequences = {}
+        for pair in pairs:
+            sequences.setdefault(pair.subset, [])
+            if pair.sequence not in sequences[pair.subset]:
+                sequences[pair.subset].append(pair.sequence)
+        selected = {(subset, sequence) for subset in sequences for sequence in sequences[subset][:num_sequences]}
+
+        with open(dataset_dir + '/' + 'image_pairs.txt') as f:
+            lines = [line for line, pair in zip([line for line in f if line.strip()], pairs) if (pair.subset, pair.sequence) in selected]
+
+        for subset, sequence in sorted(selected):
+            shutil.copytree(dataset_dir + '/' + subset + '/' + sequence, subset_dir + '/' + subset + '/' + sequence)
+        with open(subset_dir + '/' + 'image_pairs.txt', 'w') as f:
+            f.writelines(lines)
+
+    return len(read_pairs(subset_dir + '/' + 'image_pairs.txt'))
+
+
+def run_measured(command, log_path):
+    """
+    Runs a shell command with its output written to log_path.
+    Returns the exit code, the wall time in seconds and the peak resident memory of the largest single process of
+    the tree in MB. Processes running at the same time (e.g. the workers of a pool) are not summed.
+    """
+    with open(log_path, 'w') as log:
+        log.write(command + '\n\n')
+        log.flush()
+        start_time = time.perf_counter()
+        process = subprocess.Popen(command, shell=True, stdout=log, stderr=subprocess.STDOUT)
+        # the resource usage of a waited child includes all its waited descendants (conda run, python), ru_maxrss is
+        # the maximum over them
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_time = time.perf_counter() - start_time
+
+    return_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    return return_code, wall_time, usage.ru_maxrss / 1024
+
+
+def stage_latencies(output_dir):
+    """
+    Mean seconds per pair of every stage and the total from the timings.csv of an output directory
+    """
+    timings = load_timings(output_dir)
+    if not timings:
+        return {}
+    times = np.array([[pair_times[stage] for stage in STAGES + ['total']] for pair_times in timings.values()])
+    return dict(zip(STAGES + ['total'], np.mean(times, 0).tolist()))
+
+
+def run_benchmark(config, algorithms, dataset_dir, eval_dir, result_dir, ratio_th, num_pairs, wrapper_args=''):
+    """
+    Runs every algorithm wrapper (with wrapper_args) and the evaluation once on an empty result directory.
+    Returns the metrics of every algorithm and of the evaluation.
+    """
+    if os.path.exists(result_dir):
+        shutil.rmtree(result_dir)
+    log_dir = result_dir + '/' + 'logs'
+    os.makedirs(log_dir)
+
+    metrics = {}
+    for alg in algorithms:
+        out_dir = result_dir + '/' + alg
+        os.makedirs(out_dir)
+        command = ('python3 ' + config['algorithms'][alg] + '/' + 'algorithm_wrapper.py' + ' --alg_name ' + alg + ' --alg_dir ' + config['algorithms'][alg] +
+                   ' --dataset_dir ' + dataset_dir + ' --output_dir ' + out_dir + ' --ratio_th ' + str(ratio_th) + wrapper_args)
+        return_code, wall_time, peak_memory = run_measured(command, log_dir + '/' + alg + '.log')
+        if return_code != 0:
+            raise RuntimeError(f'{alg} failed with exit code {return_code}, see {log_dir}/{alg}.log')
+
+        metrics[alg] = {'wall_time': wall_time, 'throughput': num_pairs / wall_time, 'peak_memory': peak_memory,
+                        'stages': stage_latencies(out_dir + '/' + 'outputs')}
+
+    command = ('python3 ' + eval_dir + '/' + 'eval.py' + ' --algorithms ' + ' '.join(algorithms) +
+               ' --result_directory ' + result_dir + ' --dataset_dir ' + dataset_dir)
+    return_code, wall_time, peak_memory = run_measured(command, log_dir + '/' + 'eval.log')
+    if return_code != 0:
+        raise RuntimeError(f'eval.py failed with exit code {return_code}, see {log_dir}/eval.log')
+
+    metrics['eval'] = {'wall_time': wall_time, 'throughput': num_pairs * len(algorithms) / wall_time, 'peak_memory': peak_memory, 'stages': {}}
+    return metrics
+
+
+def matching_recall(exact_dir, approximate_dir, pairs):
+    """
+    Mean share of the matches of the exact matcher that the approximate matcher found too, over the pairs with matches
+    """
+    recalls = []
+    for pair in pairs:
+        exact = np.load(pair_output_path(exact_dir, pair))['matches']
+        approximate = set(map(tuple, np.load(pair_output_path(approximate_dir, pair))['matches'].tolist()))
+        if exact.shape[0] > 0:
+            recalls.append(sum(tuple(match) in approximate for match in exact.tolist()) / exact.shape[0])
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+def accuracy(result_dir, alg, pixel_threshold):
+    """
+    MMA and HEA at a pixel threshold over all pairs, from the per pair results eval.py writes
+    """
+    mma = np.loadtxt(result_dir + '/' + alg + '_mma.csv', delimiter=',', ndmin=2)
+    hom = np.loadtxt(result_dir + '/' + alg + '_hom.csv', delimiter=',', ndmin=2)
+    return float(np.mean(mma[:, pixel_threshold - 1])), float(np.mean(hom[:, pixel_threshold - 1]))
+
+
+def compare_approximate(exact, approximate, exact_dir, approximate_dir, pairs, pixel_threshold):
+    """
+    Recall, throughput and accuracy of the approximate matcher next to the exact one for every algorithm
+    """
+    comparison = {}
+    for alg in approximate:
+        if alg == 'eval':
+            continue
+        exact_mma, exact_hea = accuracy(exact_dir, alg, pixel_threshold)
+        mma, hea = accuracy(approximate_dir, alg, pixel_threshold)
+        comparison[alg] = {'recall': matching_recall(exact_dir + '/' + alg + '/' + 'outputs', approximate_dir + '/' + alg + '/' + 'outputs', pairs),
+                           'exact_throughput': exact[alg]['throughput'], 'throughput': approximate[alg]['throughput'],
+                           'exact_match': exact[alg]['stages'].get('match'), 'match': approximate[alg]['stages'].get('match'),
+                           'exact_mma': exact_mma, 'mma': mma, 'exact_hea': exact_hea, 'hea': hea}
+    return comparison
+
+
+def median_metrics(runs):
+    """
+    Median of every metric over repeated runs
+    """
+    metrics = {}
+    for name in runs[0]:
+        metrics[name] = {key: float(np.median([run[name][key] for run in runs])) for key in ['wall_time', 'throughput', 'peak_memory']}
+        metrics[name]['stages'] = {stage: float(np.median([run[name]['stages'][stage] for run in runs])) for stage in runs[0][name]['stages']}
+    return metrics
+
+
+def find_regressions(metrics, baseline, margin, min_time, num_pairs):
+    """
+    Compares the metrics with the baseline, a time or memory above baseline * (1 + margin) is a regression.
+    Times are only compared if they differ by more than min_time seconds per run (min_time / num_pairs per pair),
+    to ignore the noise of very short stages.
+    Returns a list of (name, metric, baseline value, current value).
+    """
+    regressions = []
+    for name, current in metrics.items():
+        if name not in baseline:
+            continue
+        compared = [('wall_time', baseline[name]['wall_time'], current['wall_time'], min_time),
+                    ('peak_memory', baseline[name]['peak_memory'], current['peak_memory'], 0.0)]
+        compared += [(stage, baseline[name]['stages'][stage], current['stages'][stage], min_time / num_pairs)
+                     for stage in current['stages'] if stage in baseline[name]['stages']]
+
+        for metric, old, new, tolerance in compared:
+            if new > old * (1 + margin) and new - old > tolerance:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def print_metrics(metrics, baseline):
+    """
+    Prints the metrics of every algorithm, with the change to the baseline in percent
+    """
+    def change(new, old):
+        return f' ({100 * (new - old) / old:+.0f}%)' if old else ''
+
+    for name, current in metrics.items():
+        old = baseline.get(name)
+        print(f'{name}: {current["wall_time"]:.2f}s' + (change(current['wall_time'], old['wall_time']) if old else '') +
+              f', {current["throughput"]:.2f} pairs/s, peak memory {current["peak_memory"]:.0f}MB' + (change(current['peak_memory'], old['peak_memory']) if old else ''))
+        for stage, value in current['stages'].items():
+            old_stage = old['stages'].get(stage) if old else None
+            print(f'    {stage}: {1000 * value:.2f}ms/pair' + (change(value, old_stage) if old_stage else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Performance benchmark of the algorithm wrappers and the evaluation',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--algorithms', nargs='+', default=['akaze', 'kaze', 'orb', 'sift'])
+    parser.add_argument('--dataset', type=str, default='hpatches')              # dataset of config.json the benchmark set is taken from, and its eval.py
+    parser.add_argument('--sequences', type=int, default=2)                     # sequences per subset in the benchmark set
+    parser.add_argument('--synthetic', action='store_true')                     # generate the benchmark set instead of copying it from the dataset
+    parser.add_argument('--ratio_th', type=float, default=0.8)
+    parser.add_argument('--repeats', type=int, default=3)                       # the median of the repeats is compared
+    parser.add_argument('--results', type=str, default='Results_benchmark')
+    parser.add_argument('--baseline', type=str, default='Results_benchmark/baseline.json')
+    parser.add_argument('--margin', type=float, default=0.2)                    # allowed relative slowdown
+    parser.add_argument('--min_time', type=float, default=0.05)                 # allowed absolute slowdown in seconds per run
+    parser.add_argument('--update_baseline', action='store_true')               # store the results as the new baseline
+    parser.add_argument('--warn_only', action='store_true')                     # report regressions without failing
+    parser.add_argument('--approximate', action='store_true')                   # compare the approximate FLANN matcher with the exact one
+    parser.add_argument('--flann_trees', type=int, default=4)
+    parser.add_argument('--flann_checks', type=int, default=32)
+    parser.add_argument('--pixel_threshold', type=int, default=3)               # of the MMA and HEA in the comparison
+
+    args = parser.parse_args()
+
+    with open('config.json') as f:
+        config = json.load(f)
+
+    dataset_dir = args.results + '/' + 'dataset'
+    if args.synthetic:
+        # fixed seed, the same set is generated on every machine
+        dataset_dir += '_synthetic'
+        num_pairs = generate_dataset(dataset_dir, args.sequences, seed=0)
+    else:
+        num_pairs = make_subset(config['datasets'][args.dataset], dataset_dir, args.sequences)
+
+    runs = []
+    for repeat in range(args.repeats):
+        runs.append(run_benchmark(config, args.algorithms, dataset_dir, config['datasets'][args.dataset],
+                                  args.results + '/' + 'run', args.ratio_th, num_pairs))
+    metrics = median_metrics(runs)
+
+    settings = {'algorithms': args.algorithms, 'dataset': args.dataset, 'synthetic': args.synthetic, 'pairs': num_pairs, 'ratio_th': args.ratio_th,
+                'repeats': args.repeats, 'machine': platform.node(), 'cpus': os.cpu_count()}
+    with open(args.results + '/' + 'benchmark.json', 'w') as f:
+        json.dump({'settings': settings, 'metrics': metrics}, f, indent=2)
+
+    if args.approximate:
+        # the last exact run is the reference, the approximate runs are not part of the baseline
+        algorithms = [alg for alg in args.algorithms if alg in APPROXIMATE_ALGORITHMS]
+        wrapper_args = ' --approximate --flann_trees ' + str(args.flann_trees) + ' --flann_checks ' + str(args.flann_checks)
+        approximate_runs = [run_benchmark(config, algorithms, dataset_dir, config['datasets'][args.dataset], args.results + '/' + 'approximate',
+                                          args.ratio_th, num_pairs, wrapper_args) for repeat in range(args.repeats)]
+        comparison = compare_approximate(metrics, median_metrics(approximate_runs), args.results + '/' + 'run', args.results + '/' + 'approximate',
+                                         read_pairs(dataset_dir + '/' + 'image_pairs.txt'), args.pixel_threshold)
+        with open(args.results + '/' + 'approximate.json', 'w') as f:
+            json.dump({'settings': {'flann_trees': args.flann_trees, 'flann_checks': args.flann_checks, 'pixel_threshold': args.pixel_threshold},
+                       'metrics': comparison}, f, indent=2)
+
+        print(f'Approximate matching, {args.flann_trees} trees, {args.flann_checks} checks (exact -> approximate):')
+        for alg, values in comparison.items():
+            print(f'{alg}: recall {values["recall"]:.3f}, {values["exact_throughput"]:.2f} -> {values["throughput"]:.2f} pairs/s, '
+                  f'match {1000 * values["exact_match"]:.2f} -> {1000 * values["match"]:.2f}ms/pair, '
+                  f'MMA@{args.pixel_threshold}px {values["exact_mma"]:.3f} -> {values["mma"]:.3f}, HEA@{args.pixel_threshold}px {values["exact_hea"]:.3f} -> {values["hea"]:.3f}')
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if any(stored['settings'].get(key) != settings[key] for key in ['algorithms', 'dataset', 'synthetic', 'pairs', 'ratio_th']):
+            sys.exit(f'{args.baseline} was recorded with other settings, use --update_baseline to replace it')
+        if stored['settings']['machine'] != settings['machine']:
+            print(f'Warning: {args.baseline} was recorded on {stored["settings"]["machine"]}')
+        baseline = stored['metrics']
+
+    print_metrics(metrics, baseline)
+
+    if not baseline:
+        if os.path.dirname(args.baseline) and not os.path.exists(os.path.dirname(args.baseline)):
+            os.makedirs(os.path.dirname(args.baseline))
+        shutil.copy(args.results + '/' + 'benchmark.json', args.baseline)
+        print(f'Baseline written to {args.baseline}')
+    else:
+        regressions = find_regressions(metrics, baseline, args.margin, args.min_time, num_pairs)
+        for name, metric, old, new in regressions:
+            print(f'REGRESSION {name} {metric}: {old:.4f} -> {new:.4f}')
+        if regressions and not args.warn_only:
+            sys.exit(1)
@@ -22,24 +22,42 @@ wget -P Algorithms/patch2pix/pretrained https://vision.in.tum.de/webshare/u/zhou
 #Learning-based Algorithms
 cp utils/Algorithm_Wrappers/DFM/python/algorithm_wrapper.py Algorithms/DFM/python
 cp utils/Algorithm_Wrappers/DFM/python/algorithm_wrapper_util.py Algorithms/DFM/python
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/DFM/python
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/DFM/python
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/DFM/python
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/DFM/python
+cp utils/Algorithm_Wrappers/common/memo.py Algorithms/DFM/python
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/DFM/python
 cp utils/Algorithm_Wrappers/DFM/python/$env_name Algorithms/DFM/python/environment.yml 2> /dev/null || cp utils/Algorithm_Wrappers/DFM/python/environment.yml Algorithms/DFM/python/environment.yml
 
 cp utils/Algorithm_Wrappers/patch2pix/algorithm_wrapper.py Algorithms/patch2pix
 cp utils/Algorithm_Wrappers/patch2pix/algorithm_wrapper_util.py Algorithms/patch2pix
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/patch2pix
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/patch2pix
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/patch2pix
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/patch2pix
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/patch2pix
 cp utils/Algorithm_Wrappers/patch2pix/$env_name Algorithms/patxh2pix/environment.yml 2> /dev/null || cp utils/Algorithm_Wrappers/patch2pix/environment.yml Algorithms/patch2pix/environment.yml
 
 cp utils/Algorithm_Wrappers/SuperPoint/algorithm_wrapper.py Algorithms/SuperPoint
-cp utils/Algorithm_Wrappers/SuperPoint/descriptors_sp.py Algorithms/SuperPoint
+cp utils/Algorithm_Wrappers/SuperPoint/algorithm_wrapper_util.py Algorithms/SuperPoint
+cp utils/Algorithm_Wrappers/common/matching.py Algorithms/SuperPoint
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/SuperPoint
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/SuperPoint
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/SuperPoint
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/SuperPoint
+cp utils/Algorithm_Wrappers/common/memo.py Algorithms/SuperPoint
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/SuperPoint
 cp utils/Algorithm_Wrappers/SuperPoint/$env_name Algorithms/SuperPoint/environment.yml 2> /dev/null || cp utils/Algorithm_Wrappers/SuperPoint/environment.yml Algorithms/SuperPoint/environment.yml
-cd Algorithms/SuperPoint
-cp match_pairs.py match_pairs_sp.py
-sed -i -e '272,282d' match_pairs_sp.py
-sed -i '271r descriptors_sp.py' match_pairs_sp.py
-rm descriptors_sp.py
-cd ..
-cd ..
 
 cp utils/Algorithm_Wrappers/SuperGlue/algorithm_wrapper.py Algorithms/SuperGlue
+cp utils/Algorithm_Wrappers/SuperGlue/algorithm_wrapper_util.py Algorithms/SuperGlue
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/SuperGlue
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/SuperGlue
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/SuperGlue
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/SuperGlue
+cp utils/Algorithm_Wrappers/common/memo.py Algorithms/SuperGlue
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/SuperGlue
 cp utils/Algorithm_Wrappers/SuperGlue/$env_name Algorithms/SuperGlue/environment.yml 2> /dev/null || cp utils/Algorithm_Wrappers/SuperGlue/environment.yml Algorithms/SuperGlue/environment.yml
 
 #Classical Algorithms
@@ -47,28 +65,70 @@ mkdir Algorithms/{akaze,kaze,orb,sift,surf}
 cp utils/Algorithm_Wrappers/sift/algorithm_wrapper.py Algorithms/sift
 cp utils/Algorithm_Wrappers/sift/algorithm_wrapper_util.py Algorithms/sift
 cp utils/Algorithm_Wrappers/sift/environment.yml Algorithms/sift
+cp utils/Algorithm_Wrappers/common/feature_cache.py Algorithms/sift
+cp utils/Algorithm_Wrappers/common/matching.py Algorithms/sift
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/sift
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/sift
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/sift
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/sift
+cp utils/Algorithm_Wrappers/common/parallel.py Algorithms/sift
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/sift
 
 cp utils/Algorithm_Wrappers/surf/algorithm_wrapper.py Algorithms/surf
 cp utils/Algorithm_Wrappers/surf/algorithm_wrapper_util.py Algorithms/surf
 cp utils/Algorithm_Wrappers/surf/environment.yml Algorithms/surf
+cp utils/Algorithm_Wrappers/common/feature_cache.py Algorithms/surf
+cp utils/Algorithm_Wrappers/common/matching.py Algorithms/surf
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/surf
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/surf
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/surf
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/surf
+cp utils/Algorithm_Wrappers/common/parallel.py Algorithms/surf
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/surf
 
 cp utils/Algorithm_Wrappers/orb/algorithm_wrapper.py Algorithms/orb
 cp utils/Algorithm_Wrappers/orb/algorithm_wrapper_util.py Algorithms/orb
 cp utils/Algorithm_Wrappers/orb/environment.yml Algorithms/orb
+cp utils/Algorithm_Wrappers/common/feature_cache.py Algorithms/orb
+cp utils/Algorithm_Wrappers/common/matching.py Algorithms/orb
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/orb
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/orb
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/orb
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/orb
+cp utils/Algorithm_Wrappers/common/parallel.py Algorithms/orb
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/orb
 
 cp utils/Algorithm_Wrappers/kaze/algorithm_wrapper.py Algorithms/kaze
 cp utils/Algorithm_Wrappers/kaze/algorithm_wrapper_util.py Algorithms/kaze
 cp utils/Algorithm_Wrappers/kaze/environment.yml Algorithms/kaze
+cp utils/Algorithm_Wrappers/common/feature_cache.py Algorithms/kaze
+cp utils/Algorithm_Wrappers/common/matching.py Algorithms/kaze
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/kaze
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/kaze
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/kaze
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/kaze
+cp utils/Algorithm_Wrappers/common/parallel.py Algorithms/kaze
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/kaze
 
 cp utils/Algorithm_Wrappers/akaze/algorithm_wrapper.py Algorithms/akaze
 cp utils/Algorithm_Wrappers/akaze/algorithm_wrapper_util.py Algorithms/akaze
 cp utils/Algorithm_Wrappers/akaze/environment.yml Algorithms/akaze
+cp utils/Algorithm_Wrappers/common/feature_cache.py Algorithms/akaze
+cp utils/Algorithm_Wrappers/common/matching.py Algorithms/akaze
+cp utils/Algorithm_Wrappers/common/manifest.py Algorithms/akaze
+cp utils/Algorithm_Wrappers/common/pair_index.py Algorithms/akaze
+cp utils/Algorithm_Wrappers/common/result_store.py Algorithms/akaze
+cp utils/Algorithm_Wrappers/common/timing.py Algorithms/akaze
+cp utils/Algorithm_Wrappers/common/parallel.py Algorithms/akaze
+cp utils/Algorithm_Wrappers/common/worker.py Algorithms/akaze
 
 # Download HPatches dataset
 wget -P Datasets http://icvl.ee.ic.ac.uk/vbalnt/hpatches/hpatches-sequences-release.tar.gz
 
 #Move utils to datasets' folders
 cp utils/Datasets/HPatches/hpatches_organizer.py Datasets
+cp utils/Algorithm_Wrappers/common/dataset_index.py Datasets
+cp utils/Algorithm_Wrappers/common/pair_index.py Datasets
 
 # Extract HPatches
 cd Datasets
@@ -83,6 +143,13 @@ cd ..
 conda run -n ime python3 hpatches_organizer.py
 rm *.tar.gz
 rm -rf hpatches-sequences-release
-rm -rf hpatches_organizer.py
+rm -rf hpatches_organizer.py dataset_index.py pair_index.py
 cd ..
 cp utils/Datasets/HPatches/eval.py Datasets/hpatches
+cp utils/Algorithm_Wrappers/common/manifest.py Datasets/hpatches
+cp utils/Algorithm_Wrappers/common/pair_index.py Datasets/hpatches
+cp utils/Algorithm_Wrappers/common/result_store.py Datasets/hpatches
+cp utils/Algorithm_Wrappers/common/timing.py Datasets/hpatches
+cp utils/Algorithm_Wrappers/common/dataset_index.py Datasets/hpatches
+cp utils/Algorithm_Wrappers/common/homography_cache.py Datasets/hpatches
+cp utils/Algorithm_Wrappers/common/homography_estimation.py Datasets/hpatches
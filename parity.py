@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Accuracy parity of two settings of the algorithm wrappers, by default the float32 descriptor path against float64.
+
+The wrappers and eval.py run on the benchmark set of benchmark.py once with the reference arguments and once
+with the test arguments. The match sets of every image pair are compared, pairs with different matches are
+listed with the number of matches only one of the runs found, next to the MMA, HEA and throughput of both runs.
+"""
+
+import sys
+import json
+import argparse
+import numpy as np
+from benchmark import make_subset, run_benchmark, accuracy
+from utils.Algorithm_Wrappers.common.pair_index import read_pairs, pair_output_path
+from utils.Datasets.synthetic_hpatches import generate_dataset
+
+
+def compare_matches(reference_dir, test_dir, pairs):
+    """
+    Compares the match sets of every pair of two output directories.
+    Returns a list of (pair id, matches only in the reference, matches only in the test run) of the pairs that differ.
+    """
+    differences = []
+    for pair in pairs:
+        reference = set(map(tuple, np.load(pair_output_path(reference_dir, pair))['matches'].tolist()))
+        test = set(map(tuple, np.load(pair_output_path(test_dir, pair))['matches'].tolist()))
+        if reference != test:
+            differences.append((pair.id, len(reference - test), len(test - reference)))
+    return differences
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compares the matches of the algorithm wrappers with two settings',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--algorithms', nargs='+', default=['akaze', 'kaze', 'orb', 'sift'])
+    parser.add_argument('--dataset', type=str, default='hpatches')              # dataset of config.json the pairs are taken from, and its eval.py
+    parser.add_argument('--sequences', type=int, default=2)                     # sequences per subset
+    parser.add_argument('--synthetic', action='store_true')                     # generate the pairs instead of copying them from the dataset
+    parser.add_argument('--ratio_th', type=float, default=0.8)
+    parser.add_argument('--results', type=str, default='Results_parity')
+    parser.add_argument('--reference_args', type=str, default='--descriptor_dtype float64')   # wrapper arguments of the reference, e.g. --reference_args='--matcher_backend torch'
+    parser.add_argument('--test_args', type=str, default='--descriptor_dtype float32')
+    parser.add_argument('--pixel_threshold', type=int, default=3)               # of the MMA and HEA
+    parser.add_argument('--warn_only', action='store_true')                     # report differences without failing
+
+    args = parser.parse_args()
+
+    with open('config.json') as f:
+        config = json.load(f)
+
+    dataset_dir = args.results + '/' + 'dataset'
+    if args.synthetic:
+        dataset_dir += '_synthetic'
+        num_pairs = generate_dataset(dataset_dir, args.sequences, seed=0)
+    else:
+        num_pairs = make_subset(config['datasets'][args.dataset], dataset_dir, args.sequences)
+    pairs = read_pairs(dataset_dir + '/' + 'image_pairs.txt')
+
+    runs = {}
+    for name, wrapper_args in [('reference', args.reference_args), ('test', args.test_args)]:
+        runs[name] = run_benchmark(config, args.algorithms, dataset_dir, config['datasets'][args.dataset], args.results + '/' + name,
+                                   args.ratio_th, num_pairs, ' ' + wrapper_args.strip())
+
+    report = {}
+    for alg in args.algorithms:
+        differences = compare_matches(args.results + '/' + 'reference' + '/' + alg + '/' + 'outputs',
+                                      args.results + '/' + 'test' + '/' + alg + '/' + 'outputs', pairs)
+        reference_mma, reference_hea = accuracy(args.results + '/' + 'reference', alg, args.pixel_threshold)
+        test_mma, test_hea = accuracy(args.results + '/' + 'test', alg, args.pixel_threshold)
+        report[alg] = {'identical_pairs': num_pairs - len(differences), 'differences': differences,
+                       'reference_mma': reference_mma, 'test_mma': test_mma, 'reference_hea': reference_hea, 'test_hea': test_hea,
+                       'reference_throughput': runs['reference'][alg]['throughput'], 'test_throughput': runs['test'][alg]['throughput'],
+                       'reference_match': runs['reference'][alg]['stages'].get('match'), 'test_match': runs['test'][alg]['stages'].get('match')}
+
+        print(f'{alg}: {num_pairs - len(differences)}/{num_pairs} pairs with identical matches, '
+              f'MMA@{args.pixel_threshold}px {reference_mma:.3f} -> {test_mma:.3f}, HEA@{args.pixel_threshold}px {reference_hea:.3f} -> {test_hea:.3f}, '
+              f'{report[alg]["reference_throughput"]:.2f} -> {report[alg]["test_throughput"]:.2f} pairs/s')
+        for pair_id, only_reference, only_test in differences:
+            print(f'    {pair_id}: {only_reference} matches only in the reference, {only_test} only in the test run')
+
+    with open(args.results + '/' + 'parity.json', 'w') as f:
+        json.dump({'settings': {'reference_args': args.reference_args, 'test_args': args.test_args, 'ratio_th': args.ratio_th,
+                                'pairs': num_pairs, 'pixel_threshold': args.pixel_threshold}, 'algorithms': report}, f, indent=2)
+
+    if any(report[alg]['differences'] for alg in report) and not args.warn_only:
+        sys.exit(1)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Accuracy and runtime of the batched RANSAC homography estimator of eval.py at several iteration budgets, against MAGSAC.
+
+The matched points of every pair are read from the outputs of a finished run. MAGSAC and the batched estimator at
+every budget estimate the homographies of all pairs of an algorithm, the HEA at the pixel thresholds, the share of
+pairs and thresholds with the same HEA outcome as MAGSAC (agreement) and the estimation time per pair are reported.
+"""
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+from PIL import Image
+from utils.Algorithm_Wrappers.common.pair_index import read_pairs, pair_output_path
+from utils.Algorithm_Wrappers.common.homography_estimation import magsac_homography, ransac_homographies, corner_error
+
+
+def load_point_pairs(outputs_dir, pairs):
+    """
+    Matched points (p1s, p2s) of the pairs with an output, returns them and the indices of their pairs
+    """
+    point_pairs, found = [], []
+    for i, pair in enumerate(pairs):
+        if os.path.exists(pair_output_path(outputs_dir, pair)):
+            outputs = np.load(pair_output_path(outputs_dir, pair))
+            point_pairs.append((outputs['pointsA'][outputs['matches'][:, 0]], outputs['pointsB'][outputs['matches'][:, 1]]))
+            found.append(i)
+    return point_pairs, found
+
+
+def estimate(estimator, point_pairs, ground_truth):
+    """
+    Runs an estimator on all pairs, returns its corner errors and the estimation time per pair
+    """
+    start = time.time()
+    homographies = estimator(point_pairs)
+    seconds = (time.time() - start) / max(len(point_pairs), 1)
+    errors = np.array([corner_error(H_pred, h_gt, image_size) for (H_pred, _), (h_gt, image_size) in zip(homographies, ground_truth)])
+    return errors, seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compares the batched RANSAC homography estimator at several budgets with MAGSAC',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--result_directory', type=str)                         # run with the outputs of the algorithms, e.g. Results/hpatches/0.8
+    parser.add_argument('--dataset_dir', type=str)
+    parser.add_argument('--algorithms', nargs='+', default=['akaze', 'kaze', 'orb', 'sift'])
+    parser.add_argument('--iterations', nargs='+', type=int, default=[100, 300, 1000, 5000])   # budgets of the batched estimator
+    parser.add_argument('--confidence', type=float, default=0.9999)
+    parser.add_argument('--magsac_iterations', type=int, default=5000)
+    parser.add_argument('--pixel_thresholds', nargs='+', type=float, default=[1, 3, 5, 10])    # of the HEA
+
+    args = parser.parse_args()
+
+    pairs = read_pairs(args.dataset_dir + '/' + 'image_pairs.txt')
+    thresholds = np.array(args.pixel_thresholds)
+    labels = [f'{threshold:g}px' for threshold in thresholds]
+
+    report = {}
+    for alg in args.algorithms:
+        point_pairs, found = load_point_pairs(args.result_directory + '/' + alg + '/' + 'outputs', pairs)
+        if not point_pairs:
+            print(f'{alg}: no outputs in {args.result_directory}')
+            continue
+        ground_truth = []
+        for i in found:
+            with Image.open(args.dataset_dir + '/' + pairs[i].image1) as im:
+                ground_truth.append((np.loadtxt(args.dataset_dir + '/' + pairs[i].homography), im.size))
+
+        magsac = lambda point_pairs: [magsac_homography(p1s, p2s, 3, args.magsac_iterations, args.confidence) for p1s, p2s in point_pairs]
+        reference, reference_seconds = estimate(magsac, point_pairs, ground_truth)
+        reference_correct = reference[:, np.newaxis] <= thresholds
+        report[alg] = {'pairs': len(point_pairs),
+                       'magsac': {'hea': dict(zip(labels, reference_correct.mean(0).tolist())), 'seconds_per_pair': reference_seconds}}
+        print(f'{alg} ({len(point_pairs)} pairs)')
+        print(f'    {"estimator":<16}' + ''.join(f'{"HEA@" + label:>10}' for label in labels) + f'{"agreement":>11}{"ms/pair":>10}')
+        print(f'    {"magsac":<16}' + ''.join(f'{value:>10.3f}' for value in reference_correct.mean(0)) + f'{1:>11.3f}{reference_seconds * 1000:>10.2f}')
+
+        for iterations in args.iterations:
+            batched = lambda point_pairs: ransac_homographies(point_pairs, 3, iterations, args.confidence)
+            errors, seconds = estimate(batched, point_pairs, ground_truth)
+            correct = errors[:, np.newaxis] <= thresholds
+            agreement = float(np.mean(correct == reference_correct))
+            report[alg][f'batched_{iterations}'] = {'hea': dict(zip(labels, correct.mean(0).tolist())), 'agreement': agreement, 'seconds_per_pair': seconds}
+            print(f'    {"batched " + str(iterations):<16}' + ''.join(f'{value:>10.3f}' for value in correct.mean(0)) + f'{agreement:>11.3f}{seconds * 1000:>10.2f}')
+
+    with open(args.result_directory + '/' + 'ransac_budget.json', 'w') as f:
+        json.dump({'settings': {'iterations': args.iterations, 'confidence': args.confidence, 'magsac_iterations': args.magsac_iterations,
+                                'pixel_thresholds': args.pixel_thresholds}, 'algorithms': report}, f, indent=2)
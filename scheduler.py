@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs the experiment matrix (algorithm x dataset x ratio threshold + evaluation) as a dependency graph of shell commands
+"""
+
+import os
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Job:
+    """
+    Shell command with a unique name, started once all jobs in depends_on finished successfully
+    """
+    def __init__(self, name, command, depends_on=()):
+        self.name = name
+        self.command = command
+        self.depends_on = list(depends_on)
+        self.status = 'pending'
+        self.wall_time = 0.0
+
+
+def run_job(job, log_dir):
+    """
+    Runs the command of a job in its own process, stdout and stderr are written to <log_dir>/<job.name>.log
+    """
+    start_time = time.time()
+    with open(os.path.join(log_dir, job.name + '.log'), 'w') as log:
+        log.write(job.command + '\n\n')
+        log.flush()
+        return_code = subprocess.call(job.command, shell=True, stdout=log, stderr=subprocess.STDOUT)
+    return return_code, time.time() - start_time
+
+
+def run_jobs(jobs, workers, log_dir):
+    """
+    Runs the jobs with at most 'workers' concurrent processes, respecting their dependencies.
+    Jobs depending on a failed job are skipped. Returns the jobs with their status and wall time.
+    """
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    jobs = {job.name: job for job in jobs}
+    for job in jobs.values():
+        for dependency in job.depends_on:
+            if dependency not in jobs:
+                raise ValueError(f"job '{job.name}' depends on unknown job '{dependency}'")
+
+    start_time = time.time()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # skip jobs with a failed dependency, start jobs whose dependencies are done
+            for job in jobs.values():
+                if job.status != 'pending':
+                    continue
+                dependency_status = [jobs[dependency].status for dependency in job.depends_on]
+                if any(status in ('failed', 'skipped') for status in dependency_status):
+                    job.status = 'skipped'
+                elif all(status == 'done' for status in dependency_status):
+                    job.status = 'running'
+                    running[executor.submit(run_job, job, log_dir)] = job
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job = running.pop(future)
+                return_code, job.wall_time = future.result()
+                job.status = 'done' if return_code == 0 else 'failed'
+                print(f'[{job.status}] {job.name} ({job.wall_time:.1f}s)')
+
+    # jobs still pending are part of a dependency cycle
+    for job in jobs.values():
+        if job.status == 'pending':
+            job.status = 'skipped'
+
+    print_summary(list(jobs.values()), time.time() - start_time, log_dir)
+    return list(jobs.values())
+
+
+def print_summary(jobs, total_time, log_dir):
+    """
+    Prints the status and wall time of every job and writes them to <log_dir>/summary.csv
+    """
+    name_width = max([len(job.name) for job in jobs] + [3])
+    print(f"\n{'Job':<{name_width}}  {'Status':<8}  Wall Time [s]")
+    for job in jobs:
+        print(f'{job.name:<{name_width}}  {job.status:<8}  {job.wall_time:.1f}')
+
+    counts = {status: sum(job.status == status for job in jobs) for status in ('done', 'failed', 'skipped')}
+    print(f"\n{counts['done']} done, {counts['failed']} failed, {counts['skipped']} skipped in {total_time:.1f}s")
+
+    with open(os.path.join(log_dir, 'summary.csv'), 'w') as f:
+        f.write('job,status,wall_time\n')
+        for job in jobs:
+            f.write(f'{job.name},{job.status},{job.wall_time:.3f}\n')
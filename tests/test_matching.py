@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parity of the matcher backends of common/matching.py
+"""
+
+import numpy as np
+import pytest
+from matching import (torch, MATCHER_BACKENDS, available_backends, normalize_descriptors, mnn_ratio_matcher, mnn_ratio_sweep,
+                      mnn_ratio_sweep_batch, mnn_ratio_sweep_numpy_batch, mnn_ratio_sweep_hamming, mnn_ratio_sweep_backend)
+
+RATIOS = [0.6, 0.8, 0.9, 1.0]
+
+# the original matcher runs on torch
+requires_torch = pytest.mark.skipif(torch is None, reason='torch is not installed')
+
+
+def random_descriptors(rng, num, dtype):
+    if dtype == np.uint8:
+        return rng.integers(0, 256, (num, 32), dtype=np.uint8)
+    return normalize_descriptors(rng.normal(size=(num, 128)), dtype)
+
+
+def matching_problem(rng, dtype, num1 = 300, nums2 = (250, 180, 320)):
+    """
+    Reference descriptors and targets that partly are perturbed copies of them, so that there are matches at every ratio
+    """
+    descriptors1 = random_descriptors(rng, num1, dtype)
+    descriptors2_list = []
+    for num2 in nums2:
+        descriptors2 = random_descriptors(rng, num2, dtype)
+        copies = rng.choice(num1, num2 // 2, replace=False)
+        if dtype == np.uint8:
+            flips = rng.random((num2 // 2, 32 * 8)) < 0.1
+            descriptors2[:num2 // 2] = np.packbits(np.unpackbits(descriptors1[copies], axis=1) ^ flips, axis=1)
+        else:
+            descriptors2[:num2 // 2] = normalize_descriptors(descriptors1[copies] + 0.3 * descriptors2[:num2 // 2], dtype)
+        descriptors2_list.append(descriptors2)
+    return descriptors1, descriptors2_list
+
+
+def baseline_matches(descriptors1, descriptors2, ratio):
+    """
+    Matches of the original torch matcher at a ratio threshold
+    """
+    return mnn_ratio_matcher(torch.as_tensor(descriptors1), torch.as_tensor(descriptors2), ratio=ratio)[0]
+
+
+def assert_same_results(results, expected):
+    assert len(results) == len(expected)
+    for (matches, values, ratios), (expected_matches, expected_values, expected_ratios) in zip(results, expected):
+        np.testing.assert_array_equal(matches, expected_matches)
+        np.testing.assert_allclose(values, expected_values, atol=1e-5)
+        np.testing.assert_allclose(ratios, expected_ratios, atol=1e-5)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.uint8])
+@pytest.mark.parametrize('num1', [0, 1, 2, 50])
+@pytest.mark.parametrize('num2', [0, 1, 2])
+def test_backends_agree_on_degenerate_sizes(dtype, num1, num2):
+    rng = np.random.default_rng(0)
+    descriptors = random_descriptors(rng, 50, dtype)
+    descriptors2_list = [descriptors[:num2], descriptors[10:30]]
+
+    expected = MATCHER_BACKENDS['numpy'](descriptors[:num1], descriptors2_list, True, 2**26)
+    for backend in available_backends(np.dtype(dtype)):
+        assert_same_results(MATCHER_BACKENDS[backend](descriptors[:num1], descriptors2_list, True, 2**26), expected)
+
+    # a single target descriptor is the nearest neighbor of its match without a second one, the ratio is 1
+    matches, _, ratios = expected[0]
+    if num1 == 50 and num2 == 1:
+        np.testing.assert_array_equal(matches, [[0, 0]])
+        np.testing.assert_array_equal(ratios, [1])
+
+
+@requires_torch
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_backends_agree_with_baseline_matcher(dtype):
+    rng = np.random.default_rng(1)
+    descriptors1, descriptors2_list = matching_problem(rng, dtype)
+
+    for backend in available_backends(np.dtype(dtype)):
+        results = mnn_ratio_sweep_backend(descriptors1, descriptors2_list, backend)
+        for descriptors2, (matches, _, ratios) in zip(descriptors2_list, results):
+            for ratio in RATIOS:
+                np.testing.assert_array_equal(matches[ratios <= ratio], baseline_matches(descriptors1, descriptors2, ratio))
+
+
+def test_binary_backends_agree():
+    rng = np.random.default_rng(2)
+    descriptors1, descriptors2_list = matching_problem(rng, np.uint8)
+
+    expected = MATCHER_BACKENDS['numpy'](descriptors1, descriptors2_list, True, 2**26)
+    assert all(len(matches) for matches, _, _ in expected)
+    for backend in available_backends(np.dtype(np.uint8)):
+        assert_same_results(MATCHER_BACKENDS[backend](descriptors1, descriptors2_list, True, 2**26), expected)
+
+
+@requires_torch
+def test_hamming_matcher_equals_cosine_of_bit_signs():
+    # the bits as +-1 vectors all have the same norm, their squared L2 distance is 4 times the Hamming distance.
+    # Hamming distances often tie, the targets are only perturbed copies so that every mutual neighbor is unique.
+    rng = np.random.default_rng(3)
+    descriptors1 = random_descriptors(rng, 300, np.uint8)
+    for num2 in (250, 180):
+        flips = rng.random((num2, 32 * 8)) < 0.1
+        descriptors2 = np.packbits(np.unpackbits(descriptors1[rng.choice(300, num2, replace=False)], axis=1) ^ flips, axis=1)
+        matches, distances, ratios = mnn_ratio_sweep_hamming(descriptors1, descriptors2)
+        signs1, signs2 = [normalize_descriptors(np.unpackbits(desc, axis=1) * 2.0 - 1, np.float64) for desc in (descriptors1, descriptors2)]
+        expected_matches, expected_sim, expected_ratios = mnn_ratio_sweep(torch.as_tensor(signs1), torch.as_tensor(signs2))
+        np.testing.assert_array_equal(matches, expected_matches)
+        np.testing.assert_allclose(distances, (1 - expected_sim) * signs1.shape[1] / 2, atol=1e-6)
+        np.testing.assert_allclose(ratios, expected_ratios, atol=1e-6)
+
+
+@requires_torch
+@pytest.mark.parametrize('max_elements', [4096, 30000])
+def test_blocked_results_equal_unblocked(max_elements):
+    rng = np.random.default_rng(4)
+    descriptors1, descriptors2_list = matching_problem(rng, np.float64)
+    tensors1, tensors2_list = torch.as_tensor(descriptors1), [torch.as_tensor(desc) for desc in descriptors2_list]
+
+    expected = [mnn_ratio_sweep(tensors1, tensors2) for tensors2 in tensors2_list]
+    assert_same_results([mnn_ratio_sweep(tensors1, tensors2, max_elements=max_elements) for tensors2 in tensors2_list], expected)
+    assert_same_results(mnn_ratio_sweep_batch(tensors1, tensors2_list, max_elements=max_elements, min_rows=16), expected)
+    assert_same_results(mnn_ratio_sweep_numpy_batch(descriptors1, descriptors2_list, max_elements=max_elements, min_rows=16), expected)
+
+
+@requires_torch
+@pytest.mark.parametrize('descriptor_dtype', ['float32', 'float64'])
+def test_float_matching_of_binary_descriptors_equals_float_path(descriptor_dtype):
+    # --float_matching of the ORB and AKAZE utils, the baseline matched the bytes as normalized float64 vectors
+    rng = np.random.default_rng(5)
+    descriptors1, descriptors2_list = matching_problem(rng, np.uint8)
+    descriptors = [normalize_descriptors(desc, descriptor_dtype) for desc in [descriptors1] + descriptors2_list]
+
+    for backend in available_backends(np.dtype(descriptor_dtype)):
+        results = mnn_ratio_sweep_backend(descriptors[0], descriptors[1:], backend)
+        for descriptors2, (matches, _, ratios) in zip(descriptors2_list, results):
+            for ratio in RATIOS:
+                np.testing.assert_array_equal(matches[ratios <= ratio],
+                                              baseline_matches(normalize_descriptors(descriptors1, np.float64),
+                                                               normalize_descriptors(descriptors2, np.float64), ratio))
@@ -11,6 +11,85 @@ from PIL import Image
 import numpy as np
 from DeepFeatureMatcher import DeepFeatureMatcher
 import time
+from manifest import load_manifest, is_complete, record, file_fingerprint, config_fingerprint, atomic_savez
+from worker import serve
+from pair_index import read_pairs, group_by_reference, pair_output_path
+from timing import PairTimer, record_timings
+from memo import LRUCache
+
+
+def load_model(args_util):
+    """
+    Loads the VGG19_BN based matcher, done once per process
+    """
+    return DeepFeatureMatcher(enable_two_stage=True, model = 'VGG19_BN', ratio_th = args_util.ratio_th, bidirectional=True)
+
+
+def run(args_util, fm):
+    """
+    Matches all image pairs of a dataset with one set of ratio thresholds
+    """
+    if not os.path.exists(args_util.output_dir):
+        os.makedirs(args_util.output_dir)
+    
+    # the ratio thresholds can change between jobs of a worker, the network stays loaded
+    fm.ratio_th = np.array(args_util.ratio_th)
+    
+    # pairs finished with the same configuration and input images are skipped
+    manifest_path = args_util.output_dir + '/' + 'manifest.jsonl'
+    manifest = load_manifest(manifest_path)
+    config = config_fingerprint({'algorithm': 'DFM', 'model': 'VGG19_BN', 'ratio_th': args_util.ratio_th})
+    
+    # the pairs of a sequence share their reference image, it is decoded once per sequence.
+    # Its feature pyramid is computed inside DeepFeatureMatcher.match and can't be reused from here.
+    reference_images = LRUCache()
+    
+    start_time = time.time()
+    processed_pairs = 0
+    for pair in group_by_reference(read_pairs(args_util.input_pairs)):
+        output_path = pair_output_path(args_util.output_dir, pair)
+        
+        inputs = file_fingerprint(args_util.input_dir + '/' + pair.image1, args_util.input_dir + '/' + pair.image2)
+        if is_complete(manifest, pair.id, config, inputs, [output_path]):
+            continue
+        
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        
+        timer = PairTimer()
+        
+        p1_path = args_util.input_dir + '/' + pair.image1
+        p2_path = args_util.input_dir + '/' + pair.image2
+        
+        reference_key = (p1_path, file_fingerprint(p1_path))
+        img_A = reference_images.get(reference_key)
+        if img_A is None:
+            img_A = np.array(Image.open(p1_path))
+            reference_images.put(reference_key, img_A)
+        img_B = np.array(Image.open(p2_path))
+        timer.lap('load')
+        
+        H, H_init, points_A, points_B = fm.match(img_A, img_B)
+        
+        keypoints0 = points_A.T
+        keypoints1 = points_B.T
+    
+        mtchs = np.vstack([np.arange(0,keypoints0.shape[0])]*2).T
+        timer.lap('match')
+        
+        atomic_savez(output_path, pointsA=keypoints0, pointsB=keypoints1, matches=mtchs)
+        record(manifest_path, pair.id, config, inputs)
+        timer.lap('save')
+        record_timings(args_util.output_dir, pair.id, timer)
+        processed_pairs += 1
+     
+    end_time = time.time()  
+    total_time = end_time - start_time
+    avg_time = total_time / max(processed_pairs, 1)
+                       
+    print(f'Total Execution Time for DFM is: {total_time}')
+    print(f'Average Execution Time for DFM is: {avg_time}') 
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -21,41 +100,14 @@ if __name__ == '__main__':
     parser.add_argument('--input_pairs', type=str)
     parser.add_argument('--output_dir', type=str)   
     parser.add_argument('--ratio_th', '--ratio_th', nargs='+', type=float, default=[0.9, 0.9, 0.9, 0.9, 0.95, 1.0])
+    parser.add_argument('--serve', type=str, default=None)        # run as a persistent worker on this unix socket
 
     args_util = parser.parse_args()
     
-    if not os.path.exists(args_util.output_dir):
-        os.makedirs(args_util.output_dir)
-    
-    fm = DeepFeatureMatcher(enable_two_stage=True, model = 'VGG19_BN', ratio_th = args_util.ratio_th, bidirectional=True)
-    
-    with open(args_util.input_pairs) as f:
-        start_time = time.time()
-        for total_pair_number, line in enumerate(f):
-            pairs = line.split(' ')
-            p1_path = args_util.input_dir + '/' + pairs[0]
-            p2_path = args_util.input_dir + '/' + pairs[1]
-            
-            img_A = np.array(Image.open(p1_path))
-            img_B = np.array(Image.open(p2_path))
-            
-            H, H_init, points_A, points_B = fm.match(img_A, img_B)
-            
-            keypoints0 = points_A.T
-            keypoints1 = points_B.T
-        
-            mtchs = np.vstack([np.arange(0,keypoints0.shape[0])]*2).T
-            
-            p1 = pairs[0].split('/')[2].split('.')[0]
-            p2 = pairs[1].split('/')[2].split('.')[0]
-                        
-            np.savez_compressed(args_util.output_dir + '/' + p1 + '_' + p2 + '_' + 'matches', 
-                                keypoints0=keypoints0, keypoints1=keypoints1, matches=mtchs)
-         
-        end_time = time.time()  
-        total_time = end_time - start_time
-        avg_time = total_time / (total_pair_number+1)
-                           
-        print(f'Total Execution Time for DFM is: {total_time}')
-        print(f'Average Execution Time for DFM is: {avg_time}') 
+    fm = load_model(args_util)
     
+    # A worker takes the arguments of this script as jobs and keeps the network loaded between them
+    if args_util.serve:
+        serve(args_util.serve, lambda job: run(parser.parse_args(job), fm))
+    else:
+        run(args_util, fm)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri May 21 14:15:00 2021
+
+@authors: kutalmisince and ufukefe
+"""
+import os
+import argparse
+import numpy as np
+import torch
+import time
+from models.matching import Matching
+from models.utils import read_image
+from manifest import load_manifest, is_complete, record, file_fingerprint, config_fingerprint, atomic_savez
+from worker import serve
+from pair_index import read_pairs, group_by_reference, pair_output_path
+from timing import PairTimer, record_timings
+from memo import LRUCache
+
+torch.set_grad_enabled(False)
+
+
+def load_model(args_util):
+    """
+    Loads SuperPoint and the outdoor SuperGlue weights with the settings of match_pairs.py, done once per process.
+    Returns the model and its device.
+    """
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    config = {
+        'superpoint': {'nms_radius': 4, 'keypoint_threshold': 0.005, 'max_keypoints': 1024},
+        'superglue': {'weights': 'outdoor', 'sinkhorn_iterations': 20, 'match_threshold': args_util.ratio_th}
+    }
+    return Matching(config).eval().to(device), device
+
+
+def run(args_util, model):
+    """
+    Matches all image pairs of a dataset with one match threshold
+    """
+    matching, device = model
+    
+    if not os.path.exists(args_util.output_dir):
+        os.makedirs(args_util.output_dir)
+    
+    # the match threshold can change between jobs of a worker, the network stays loaded
+    matching.superglue.config['match_threshold'] = args_util.ratio_th
+    
+    # pairs finished with the same configuration and input images are skipped
+    manifest_path = args_util.output_dir + '/' + 'manifest.jsonl'
+    manifest = load_manifest(manifest_path)
+    config = config_fingerprint({'algorithm': 'SuperGlue', 'superpoint': matching.superpoint.config, 'superglue': matching.superglue.config})
+    
+    # the pairs of a sequence share their reference image, its SuperPoint features are computed once per sequence
+    reference_features = LRUCache()
+    
+    start_time = time.time()
+    processed_pairs = 0
+    for pair in group_by_reference(read_pairs(args_util.input_pairs)):
+        output_path = pair_output_path(args_util.output_dir, pair)
+        
+        inputs = file_fingerprint(args_util.input_dir + '/' + pair.image1, args_util.input_dir + '/' + pair.image2)
+        if is_complete(manifest, pair.id, config, inputs, [output_path]):
+            continue
+        
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        
+        timer = PairTimer()
+        
+        #Images in original resolution (--resize -1), no rotation
+        reference_key = (args_util.input_dir + '/' + pair.image1, file_fingerprint(args_util.input_dir + '/' + pair.image1))
+        reference = reference_features.get(reference_key)
+        if reference is None:
+            _, inp0, _ = read_image(args_util.input_dir + '/' + pair.image1, device, [-1], 0, False)
+            reference = (inp0, {k + '0': v for k, v in matching.superpoint({'image': inp0}).items()})
+            reference_features.put(reference_key, reference)
+        inp0, pred0 = reference
+        _, inp1, _ = read_image(args_util.input_dir + '/' + pair.image2, device, [-1], 0, False)
+        timer.lap('load')
+        
+        # Matching only runs SuperPoint on image1, the reference features are passed in
+        pred = {**pred0, **matching({'image0': inp0, 'image1': inp1, **pred0})}
+        pred = {k: v[0].cpu().numpy() for k, v in pred.items()}
+        
+        #Matches as index pairs, unmatched keypoints have -1 in matches0
+        mtchs = pred['matches0']
+        matches = np.vstack(((mtchs > -1).nonzero(), mtchs[mtchs > -1])).T.astype('int32')
+        timer.lap('match')                                                                      # SuperPoint and SuperGlue
+        
+        atomic_savez(output_path, pointsA=pred['keypoints0'], pointsB=pred['keypoints1'], matches=matches)
+        record(manifest_path, pair.id, config, inputs)
+        timer.lap('save')
+        record_timings(args_util.output_dir, pair.id, timer)
+        processed_pairs += 1
+        
+    end_time = time.time()  
+    total_time = end_time - start_time
+    avg_time = total_time / max(processed_pairs, 1)
+       
+    print(f'Total Execution Time for SuperGlue is: {total_time}')
+    print(f'Average Execution Time for SuperGlue is: {avg_time}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Algorithm wrapper for Image Matching Evaluation',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--alg_dir', type=str)
+    parser.add_argument('--input_dir', type=str)
+    parser.add_argument('--input_pairs', type=str)
+    parser.add_argument('--output_dir', type=str) 
+    parser.add_argument('--ratio_th', type=float, default=0.2)    # SuperGlue's match threshold
+    parser.add_argument('--serve', type=str, default=None)        # run as a persistent worker on this unix socket
+
+    args_util = parser.parse_args()                    
+    
+    model = load_model(args_util)
+    
+    # A worker takes the arguments of this script as jobs and keeps the network loaded between them
+    if args_util.serve:
+        serve(args_util.serve, lambda job: run(parser.parse_args(job), model))
+    else:
+        run(args_util, model)
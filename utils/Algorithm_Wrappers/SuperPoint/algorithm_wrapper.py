@@ -8,45 +8,22 @@ Created on Fri May 21 14:15:00 2021
 import os
 import argparse
 import numpy as np
+from manifest import load_manifest, is_complete, record, file_fingerprint, config_fingerprint, atomic_savez
+from worker import run_util
+from pair_index import read_pairs, group_sequences, index_outputs, pair_output_path
+from result_store import pack_outputs
+from timing import PairTimer, record_timings, load_timings
 import torch
 import time
+from matching import normalize_descriptors, mnn_ratio_sweep_batch
 
-#SuperPoint's Matcher
 
-def mnn_ratio_matcher(descriptors1, descriptors2, ratio=0.8, bidirectional = True):
-    
-    # Mutual NN + symmetric Lowe's ratio test matcher for L2 normalized descriptors.
-    device = descriptors1.device
-    sim = descriptors1 @ descriptors2.t()
-
-    # Retrieve top 2 nearest neighbors 1->2.
-    nns_sim, nns = torch.topk(sim, 2, dim=1)
-    nns_dist = 2 - 2 * nns_sim
-    # Compute Lowe's ratio.
-    ratios12 = nns_dist[:, 0] / (nns_dist[:, 1] + 1e-8)
-    # Save first NN and match similarity.
-    nn12 = nns[:, 0]
-    match_sim = nns_sim[:, 0]
-
-    # Retrieve top 2 nearest neighbors 1->2.
-    nns_sim, nns = torch.topk(sim.t(), 2, dim=1)
-    nns_dist = 2 - 2 * nns_sim
-    # Compute Lowe's ratio.
-    ratios21 = nns_dist[:, 0] / (nns_dist[:, 1] + 1e-8)
-    # Save first NN.
-    nn21 = nns[:, 0]
-    
-    # if not bidirectional, do not use ratios from 2 to 1
-    ratios21[:] *= 1 if bidirectional else 0
-        
-    # Mutual NN + symmetric ratio test.
-    ids1 = torch.arange(0, sim.shape[0], device=device)
-    mask = torch.min(ids1 == nn21[nn12], torch.min(ratios12 <= ratio, ratios21[nn12] <= ratio)) # discard ratios21 to get the same results with matlab
-    # Final matches.
-    matches = torch.stack([ids1[mask], nn12[mask]], dim=-1)
-    match_sim = match_sim[mask]
-
-    return (matches.data.cpu().numpy(),match_sim.data.cpu().numpy())
+def sweep_complete(original_dir, pairs_file):
+    """
+    Checks if the ratio sweep outputs of all image pairs exist
+    """
+    original_outputs = index_outputs(original_dir)
+    return all(pair.id in original_outputs for pair in read_pairs(pairs_file))
 
 
 #First, extract and save the original algorithm's output
@@ -60,77 +37,125 @@ if __name__ == '__main__':
     parser.add_argument('--dataset_dir', type=str) 
     parser.add_argument('--output_dir', type=str)    
     parser.add_argument('--ratio_th', type=float, default=0.5)
+    parser.add_argument('--sweep_dir', type=str, default=None)     # shared by all ratio thresholds of a dataset
+    parser.add_argument('--worker', type=str, default=None)        # pool directory of persistent workers, otherwise conda run
+    parser.add_argument('--descriptor_dtype', type=str, default='float32', choices=['float32', 'float64'])  # of the normalized descriptors in the matcher
 
     args = parser.parse_args()
     
+    # In sweep mode the features are extracted once and all mutual NN matches are stored with their ratios,
+    # every ratio threshold selects from them
+    original_dir = (args.sweep_dir if args.sweep_dir else args.output_dir) + '/' + 'original_outputs'
+    sweep_matches_dir = args.sweep_dir + '/' + 'sweep_matches' if args.sweep_dir else None
+    
+    if sweep_matches_dir and not os.path.exists(sweep_matches_dir):
+        os.makedirs(sweep_matches_dir)
+    
     #Start time before feature extraction
     start_time = time.time()
     
-    #Run SuperPoint, hiding output print with > /dev/null
-    os.system('conda run -n ' + args.alg_name + ' python3 ' + args.alg_dir + '/' + 'match_pairs_sp.py' +
-              ' --input_dir ' + args.dataset_dir + ' --input_pairs ' + args.dataset_dir + '/' + 'image_pairs.txt' +
-              ' --output_dir ' + args.output_dir + '/' + 'original_outputs' + ' --resize -1' + ' --keypoint_threshold 0.005 > /dev/null') 
+    #Run SuperPoint with the settings of match_pairs.py (--resize -1 --keypoint_threshold 0.005)
+    if not (args.sweep_dir and sweep_complete(original_dir, args.dataset_dir + '/' + 'image_pairs.txt')):
+        run_util(args.alg_name, args.alg_dir,
+                 ['--alg_dir', args.alg_dir, '--input_dir', args.dataset_dir,
+                  '--input_pairs', args.dataset_dir + '/' + 'image_pairs.txt',
+                  '--output_dir', original_dir], args.worker)
 
-    #Then, read saved outputs and transform to proper format (keypointsA, keypointsB, matches)  
-    pairs_out = os.listdir(args.output_dir  + '/' + 'original_outputs')
+    #Then, match the saved features and write them in the evaluation format (pointsA, pointsB, matches)
+    original_outputs = index_outputs(original_dir)
+    
+    # pairs converted from the same original output with the same configuration are skipped
+    if not os.path.exists(args.output_dir + '/' + 'outputs'):
+        os.makedirs(args.output_dir + '/' + 'outputs')
+    manifest_path = args.output_dir + '/' + 'outputs' + '/' + 'manifest.jsonl'
+    manifest = load_manifest(manifest_path)
+    config = config_fingerprint({'ratio_th': args.ratio_th, 'descriptors': args.descriptor_dtype})
+    original_timings = load_timings(original_dir)
     
-    with open(args.dataset_dir + '/' + 'image_pairs.txt') as f:
-        for total_pair_number, line in enumerate(f):
-            pairs = line.split(' ')
-            subset = pairs[0].split('/')[0]
-            subsubset = pairs[0].split('/')[1]
-            p1 = pairs[0].split('/')[2].split('.')[0]
-            p2 = pairs[1].split('/')[2].split('.')[0]
+    pairs = read_pairs(args.dataset_dir + '/' + 'image_pairs.txt')
+    
+    for sequence in group_sequences([pair for pair in pairs if pair.id in original_outputs]):
+        todo = []
+        for pair in sequence:
+            output_path = pair_output_path(args.output_dir + '/' + 'outputs', pair)
+            if not os.path.exists(os.path.dirname(output_path)):
+                os.makedirs(os.path.dirname(output_path))
             
-            if not os.path.exists(args.output_dir + '/' + 'outputs' + '/' + subset + '/' + subsubset):
-                os.makedirs(args.output_dir + '/' + 'outputs' + '/' + subset + '/' + subsubset)
+            inputs = file_fingerprint(original_outputs[pair.id])
+            if is_complete(manifest, pair.id, config, inputs, [output_path]):
+                continue
             
-            for k in pairs_out:
-                if p1 in k and p2 in k:
-                    
-                    # Original Algorithm's Output
-                    pair_out = np.load(args.output_dir + '/' + 'original_outputs' + '/' + k)
-                    
-                    keypoints0 = pair_out['keypoints0']
-                    keypoints1 = pair_out['keypoints1']
-                    descriptors0 = pair_out['descriptors0']
-                    descriptors1 = pair_out['descriptors1']
-                    descriptors0 = descriptors0.T
-                    descriptors1 = descriptors1.T
-                      
-                    #Arrange dtype
-                    descriptors0 = descriptors0.astype(float)
-                    descriptors1 = descriptors1.astype(float)
-
-                    #Normalize descs
-                    descriptors0 = torch.as_tensor(descriptors0 / np.sqrt((descriptors0*descriptors0).sum(axis=1))[:, np.newaxis])
-                    descriptors1 = torch.as_tensor(descriptors1 / np.sqrt((descriptors1*descriptors1).sum(axis=1))[:, np.newaxis])
-                            		    
-                    if torch.cuda.is_available():
-                        descriptors0 = descriptors0.to('cuda')
-                        descriptors1 = descriptors1.to('cuda')
+            # the image loading and detection of the util are counted for every threshold using its features
+            timer = PairTimer()
+            timer.add(original_timings.get(pair.id, {}))
+            
+            # Original Algorithm's Output
+            pair_out = dict(np.load(original_outputs[pair.id]))
+            
+            # Matches and ratios from the sweep, if they were computed from the same features in the same dtype
+            if sweep_matches_dir and os.path.exists(sweep_matches_dir + '/' + pair.name):
+                sweep_out = np.load(sweep_matches_dir + '/' + pair.name)
+                if str(sweep_out['source']) == inputs + ',' + args.descriptor_dtype:
+                    pair_out['matches'] = sweep_out['matches']
+                    pair_out['ratios'] = sweep_out['ratios']
+            timer.lap('load')
+            
+            todo.append((pair, output_path, inputs, timer, pair_out))
+        
+        # the remaining pairs with the same reference features are matched together
+        references = {}
+        for item in todo:
+            if 'matches' not in item[4]:
+                references.setdefault(item[4]['descriptors0'].tobytes(), []).append(item)
+        
+        for batch in references.values():
+            batch_timer = PairTimer()
+            
+            descriptors = [batch[0][4]['descriptors0']] + [pair_out['descriptors1'] for _, _, _, _, pair_out in batch]
+              
+            #Normalize descs, one copy each in the descriptor dtype
+            descriptors = [torch.as_tensor(normalize_descriptors(desc.T, args.descriptor_dtype)) for desc in descriptors]
+                    		    
+            if torch.cuda.is_available():
+                descriptors = [desc.to('cuda') for desc in descriptors]
 		    
-                    #Find Matches (used .t() for tensor transpose different from classicals)
-                    mtchs = mnn_ratio_matcher(descriptors0, descriptors1, ratio=args.ratio_th, bidirectional = True)
-
-                    mtchs = mtchs[0]
+            #Find all mutual NN matches with their ratios (used .t() for tensor transpose different from classicals)
+            results = mnn_ratio_sweep_batch(descriptors[0], descriptors[1:], bidirectional = True)
 		    
-                    #Remove GPU memory
-                    torch.cuda.empty_cache()
-
-                    # Wrapper's OutputS
-                    pointsA = keypoints0
-                    pointsB = keypoints1
-                    matches = mtchs[0:2,:].T.astype('int32')                     
-                    
-                    np.savez_compressed(args.output_dir + '/' + 'outputs' + '/' + subset + '/' + subsubset + 
-                                        '/' + k, pointsA=pointsA, pointsB=pointsB, matches=mtchs)
+            #Remove GPU memory
+            torch.cuda.empty_cache()
+            batch_timer.lap('match')
+            
+            for (pair, _, inputs, timer, pair_out), (mtchs, _, ratios) in zip(batch, results):
+                pair_out['matches'] = mtchs
+                pair_out['ratios'] = ratios
+                timer.times['match'] += batch_timer.times['match'] / len(batch)
+                
+                if sweep_matches_dir:
+                    atomic_savez(sweep_matches_dir + '/' + pair.name, matches=mtchs, ratios=ratios, source=inputs + ',' + args.descriptor_dtype)
+        
+        for pair, output_path, inputs, timer, pair_out in todo:
+            pair_timer = PairTimer()
+            
+            # Wrapper's OutputS, only the matches passing this ratio threshold
+            pointsA = pair_out['keypoints0']
+            pointsB = pair_out['keypoints1']
+            matches = pair_out['matches'][pair_out['ratios'] <= args.ratio_th]
+            ratios = pair_out['ratios'][pair_out['ratios'] <= args.ratio_th]
+            pair_timer.lap('match')
+            
+            atomic_savez(output_path, pointsA=pointsA, pointsB=pointsB, matches=matches, ratios=ratios)
+            record(manifest_path, pair.id, config, inputs)
+            pair_timer.lap('save')
+            timer.add(pair_timer.times)
+            record_timings(args.output_dir + '/' + 'outputs', pair.id, timer)
     
     end_time = time.time()                                     
     total_time = end_time - start_time
-    avg_time = total_time / (total_pair_number+1)
+    avg_time = total_time / len(pairs)
                            
     print(f'Total Execution Time for SuperPoint is: {total_time}')
-    print(f'Average Execution Time for SuperPoint is: {avg_time}') 
-                    
-          
+    print(f'Average Execution Time for SuperPoint is: {avg_time}')
+
+    # pack the outputs of all pairs into one memory-mapped store for the evaluation
+    pack_outputs(args.output_dir + '/' + 'outputs', read_pairs(args.dataset_dir + '/' + 'image_pairs.txt'), args.output_dir + '/' + 'store')
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri May 21 14:15:00 2021
+
+@authors: kutalmisince and ufukefe
+"""
+import os
+import argparse
+import torch
+import time
+from models.superpoint import SuperPoint
+from models.utils import read_image
+from manifest import load_manifest, is_complete, record, file_fingerprint, config_fingerprint, atomic_savez
+from worker import serve
+from pair_index import read_pairs, group_by_reference
+from timing import PairTimer, record_timings
+from memo import LRUCache
+
+torch.set_grad_enabled(False)
+
+
+def load_model(args_util):
+    """
+    Loads SuperPoint with the settings of match_pairs.py, done once per process.
+    Returns the model and its device.
+    """
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    config = {'nms_radius': 4, 'keypoint_threshold': 0.005, 'max_keypoints': 1024}
+    return SuperPoint(config).eval().to(device), device
+
+
+def run(args_util, model):
+    """
+    Extracts keypoints and descriptors of all image pairs of a dataset, the matching is done by the wrapper
+    """
+    superpoint, device = model
+    
+    if not os.path.exists(args_util.output_dir):
+        os.makedirs(args_util.output_dir)
+    
+    # pairs finished with the same configuration and input images are skipped
+    manifest_path = args_util.output_dir + '/' + 'manifest.jsonl'
+    manifest = load_manifest(manifest_path)
+    config = config_fingerprint({'algorithm': 'SuperPoint', 'superpoint': superpoint.config})
+    
+    # the pairs of a sequence share their reference image, its features are extracted once per sequence
+    reference_features = LRUCache()
+    
+    start_time = time.time()
+    processed_pairs = 0
+    for pair in group_by_reference(read_pairs(args_util.input_pairs)):
+        output_path = args_util.output_dir + '/' + pair.name
+        
+        inputs = file_fingerprint(args_util.input_dir + '/' + pair.image1, args_util.input_dir + '/' + pair.image2)
+        if is_complete(manifest, pair.id, config, inputs, [output_path]):
+            continue
+        
+        timer = PairTimer()
+        
+        #Images in original resolution (--resize -1), no rotation
+        reference_key = (args_util.input_dir + '/' + pair.image1, file_fingerprint(args_util.input_dir + '/' + pair.image1))
+        features0 = reference_features.get(reference_key)
+        if features0 is None:
+            _, inp0, _ = read_image(args_util.input_dir + '/' + pair.image1, device, [-1], 0, False)
+        _, inp1, _ = read_image(args_util.input_dir + '/' + pair.image2, device, [-1], 0, False)
+        timer.lap('load')
+        
+        if features0 is None:
+            pred0 = superpoint({'image': inp0})
+            features0 = {'keypoints0': pred0['keypoints'][0].cpu().numpy(), 'descriptors0': pred0['descriptors'][0].cpu().numpy()}
+            reference_features.put(reference_key, features0)
+        pred1 = superpoint({'image': inp1})
+        features = {**features0, 'keypoints1': pred1['keypoints'][0].cpu().numpy(), 'descriptors1': pred1['descriptors'][0].cpu().numpy()}
+        timer.lap('detect')
+        
+        atomic_savez(output_path, **features)
+        record(manifest_path, pair.id, config, inputs)
+        timer.lap('save')
+        record_timings(args_util.output_dir, pair.id, timer)
+        processed_pairs += 1
+        
+    end_time = time.time()  
+    total_time = end_time - start_time
+    avg_time = total_time / max(processed_pairs, 1)
+       
+    print(f'Total Execution Time for SuperPoint is: {total_time}')
+    print(f'Average Execution Time for SuperPoint is: {avg_time}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Algorithm wrapper for Image Matching Evaluation',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--alg_dir', type=str)
+    parser.add_argument('--input_dir', type=str)
+    parser.add_argument('--input_pairs', type=str)
+    parser.add_argument('--output_dir', type=str) 
+    parser.add_argument('--serve', type=str, default=None)        # run as a persistent worker on this unix socket
+
+    args_util = parser.parse_args()                    
+    
+    model = load_model(args_util)
+    
+    # A worker takes the arguments of this script as jobs and keeps the network loaded between them
+    if args_util.serve:
+        serve(args_util.serve, lambda job: run(parser.parse_args(job), model))
+    else:
+        run(args_util, model)
@@ -1,13 +0,0 @@
-        if do_match:
-            # Perform the matching.
-            pred = matching({'image0': inp0, 'image1': inp1})
-            pred = {k: v[0].cpu().numpy() for k, v in pred.items()}
-            kpts0, kpts1 = pred['keypoints0'], pred['keypoints1']
-            matches, conf = pred['matches0'], pred['matching_scores0']
-            dsc0, dsc1 = pred['descriptors0'], pred['descriptors1']
-            timer.update('matcher')
-
-            # Write the matches to disk.
-            out_matches = {'keypoints0': kpts0, 'keypoints1': kpts1,
-                           'matches': matches, 'match_confidence': conf,
-                           'descriptors0': dsc0, 'descriptors1': dsc1}
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binary index of the image pairs of a dataset and their geometry, built once and memory-mapped afterwards.
+
+<dataset_dir>/index holds the stacked ground truth homographies (n, 3, 3), the (width, height) of both
+images of every pair (n, 2, 2) and the subset of every pair as an id into the subset names, next to
+index.json with the lines of image_pairs.txt and its content hash. The index is valid as long as
+image_pairs.txt has the same content, changed images of the same pairs are not noticed, so a dataset
+derived from another one (e.g. by augment_noise.py) builds its own index.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from PIL import Image
+from pair_index import parse_pair
+
+INDEX_DIR = 'index'
+
+
+class DatasetIndex:
+    """
+    Pairs of a dataset with their memory-mapped homographies, image sizes and subset ids
+    """
+    def __init__(self, index_dir):
+        with open(index_dir + '/' + 'index.json') as f:
+            self.meta = json.load(f)
+        self.pairs = [parse_pair(line) for line in self.meta['lines']]
+        self.subset_names = self.meta['subsets']
+        self.homographies = np.load(index_dir + '/' + 'homographies.npy', mmap_mode='r')
+        self.image_sizes = np.load(index_dir + '/' + 'image_sizes.npy', mmap_mode='r')
+        self.subsets = np.load(index_dir + '/' + 'subsets.npy', mmap_mode='r')
+
+    @property
+    def key(self):
+        """
+        Content hash of the image_pairs.txt the index was built from
+        """
+        return self.meta['pairs_hash']
+
+    def count(self, subset):
+        """
+        Number of pairs of a subset
+        """
+        if subset not in self.subset_names:
+            return 0
+        return int(np.count_nonzero(self.subsets == self.subset_names.index(subset)))
+
+
+def pairs_hash(dataset_dir):
+    """
+    Content hash of the image_pairs.txt of a dataset
+    """
+    with open(dataset_dir + '/' + 'image_pairs.txt', 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def build_index(dataset_dir):
+    """
+    Reads the homographies and image sizes of all pairs of a dataset and writes its index, returns the number of pairs
+    """
+    with open(dataset_dir + '/' + 'image_pairs.txt') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    pairs = [parse_pair(line) for line in lines]
+
+    homographies = np.zeros((len(pairs), 3, 3))
+    image_sizes = np.zeros((len(pairs), 2, 2), dtype=np.int64)
+    for i, pair in enumerate(pairs):
+        if pair.homography is not None:
+            homographies[i] = np.loadtxt(dataset_dir + '/' + pair.homography)
+        for j, image in enumerate([pair.image1, pair.image2]):
+            with Image.open(dataset_dir + '/' + image) as im:     # reads only the header
+                image_sizes[i, j] = im.size
+
+    subset_names = sorted(set(pair.subset for pair in pairs))
+    subsets = np.array([subset_names.index(pair.subset) for pair in pairs], dtype=np.uint8)
+
+    # write next to the index and swap it in, a killed run leaves the old index intact
+    index_dir = dataset_dir + '/' + INDEX_DIR
+    tmp_dir = index_dir + f'.{os.getpid()}.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    np.save(tmp_dir + '/' + 'homographies.npy', homographies)
+    np.save(tmp_dir + '/' + 'image_sizes.npy', image_sizes)
+    np.save(tmp_dir + '/' + 'subsets.npy', subsets)
+    with open(tmp_dir + '/' + 'index.json', 'w') as f:
+        json.dump({'pairs_hash': pairs_hash(dataset_dir), 'subsets': subset_names, 'lines': lines}, f)
+
+    # evaluations of the same dataset may build it at the same time, a valid index written by another one is kept
+    if index_valid(dataset_dir):
+        shutil.rmtree(tmp_dir)
+        return len(pairs)
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    try:
+        os.rename(tmp_dir, index_dir)
+    except OSError:
+        if not index_valid(dataset_dir):
+            raise
+        shutil.rmtree(tmp_dir)
+    return len(pairs)
+
+
+def index_valid(dataset_dir):
+    """
+    Checks if the index of a dataset exists and was built from its current image_pairs.txt
+    """
+    index_path = dataset_dir + '/' + INDEX_DIR + '/' + 'index.json'
+    if not os.path.exists(index_path):
+        return False
+    with open(index_path) as f:
+        return json.load(f)['pairs_hash'] == pairs_hash(dataset_dir)
+
+
+def load_index(dataset_dir):
+    """
+    Opens the index of a dataset, it is built on first use and rebuilt if image_pairs.txt changed
+    """
+    if not index_valid(dataset_dir):
+        build_index(dataset_dir)
+    return DatasetIndex(dataset_dir + '/' + INDEX_DIR)
+
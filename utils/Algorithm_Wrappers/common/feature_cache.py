@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Feature cache shared by the classical algorithm wrappers.
+
+Keypoints and descriptors only depend on the image and the detector, not on the ratio threshold.
+They are extracted once per (algorithm, dataset) and reused by every run of the threshold sweep.
+"""
+
+import os
+import numpy as np
+import cv2
+from manifest import file_fingerprint, atomic_savez
+
+
+def feature_cache_path(feature_dir, image_name):
+    """
+    Returns the cache file for an image given by its path relative to the dataset (as in image_pairs.txt)
+    """
+    return os.path.join(feature_dir, os.path.splitext(image_name)[0] + '.npz')
+
+
+def extract_features(detector, image_path, timer=None):
+    """
+    Detects keypoints and computes descriptors on the grayscale image, keypoints are returned as a numpy array.
+    Reading the image is timed as 'load', the detection as 'detect' if a PairTimer is given.
+    """
+    img = cv2.imread(image_path)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if timer is not None:
+        timer.lap('load')
+    keypoints, descriptors = detector.detectAndCompute(gray, None)
+    keypoints = cv2.KeyPoint_convert(keypoints)
+    if timer is not None:
+        timer.lap('detect')
+    return keypoints, descriptors
+
+
+def load_or_extract(detector, input_dir, image_name, feature_dir=None, timer=None):
+    """
+    Loads the features of an image from the cache, or extracts and caches them if they don't exist yet.
+    Without a feature_dir the features are always extracted. A cache hit is timed as 'load'.
+    """
+    image_path = os.path.join(input_dir, image_name)
+    if feature_dir is None:
+        return extract_features(detector, image_path, timer)
+
+    # the cache is only valid for the image it was extracted from
+    cache_path = feature_cache_path(feature_dir, image_name)
+    fingerprint = file_fingerprint(image_path)
+    if os.path.exists(cache_path):
+        features = np.load(cache_path)
+        if 'fingerprint' in features.files and str(features['fingerprint']) == fingerprint:
+            keypoints, descriptors = features['keypoints'], features['descriptors']
+            if timer is not None:
+                timer.lap('load')
+            return keypoints, descriptors
+
+    keypoints, descriptors = extract_features(detector, image_path, timer)
+
+    if not os.path.exists(os.path.dirname(cache_path)):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+    # uncompressed, the cache is read once per ratio threshold
+    atomic_savez(cache_path, compressed=False, keypoints=keypoints, descriptors=descriptors, fingerprint=fingerprint)
+    if timer is not None:
+        timer.lap('detect')
+    return keypoints, descriptors
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of estimated homographies, shared by all evaluations that point to the same cache directory.
+
+An entry holds the homography and the inlier mask estimated from one set of matched points and is keyed by
+a hash of the point arrays and the estimator parameters. Runs with identical matches (saturated ratio
+thresholds, algorithms ignoring the ratio threshold, a repeated evaluation) read the entry instead of
+estimating again. Entries are single files written atomically, a hit refreshes the modification time and
+evict removes the least recently used entries beyond a size limit.
+"""
+
+import os
+import json
+import hashlib
+import zipfile
+import numpy as np
+from manifest import atomic_savez
+
+
+class HomographyCache:
+    """
+    Homographies and inlier masks in cache_dir for the estimator parameters params (json serializable)
+    """
+    def __init__(self, cache_dir, params):
+        self.cache_dir = cache_dir
+        self.params = json.dumps(params, sort_keys=True).encode()
+
+    def key(self, p1s, p2s):
+        """
+        Hash of the matched points with their dtype and shape and of the estimator parameters
+        """
+        digest = hashlib.sha1(self.params)
+        for points in [p1s, p2s]:
+            points = np.ascontiguousarray(points)
+            digest.update(f'{points.dtype.str}{points.shape}'.encode())
+            digest.update(points.tobytes())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return self.cache_dir + '/' + key[:2] + '/' + key + '.npz'
+
+    def get(self, key):
+        """
+        Returns the (homography or None, inliers) of key, None if it is not cached
+        """
+        try:
+            with np.load(self.path(key)) as entry:
+                homography, inliers = (entry['homography'] if entry['found'] else None), entry['inliers']
+            os.utime(self.path(key))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):     # missing, evicted by another process meanwhile or damaged
+            return None
+        return homography, inliers
+
+    def put(self, key, homography, inliers):
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)     # workers may create it at the same time
+        atomic_savez(self.path(key), compressed=False, found=homography is not None,
+                     homography=homography if homography is not None else np.zeros((3, 3)),
+                     inliers=inliers if inliers is not None else np.zeros(0))
+
+
+def evict(cache_dir, max_bytes):
+    """
+    Removes the least recently used entries until the cache takes at most max_bytes, returns the number of removed entries
+    """
+    if not os.path.exists(cache_dir):
+        return 0
+
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith('.npz'):
+                try:
+                    stat = os.stat(root + '/' + name)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, root + '/' + name))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+        removed += 1
+    return removed
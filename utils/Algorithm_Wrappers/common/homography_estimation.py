@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Homography estimators of the evaluation and the corner error of an estimate.
+
+magsac_homography runs OpenCV's MAGSAC on one pair. ransac_homographies estimates the homographies of many
+pairs at once with NumPy: minimal samples of 4 matches are drawn for a round of hypotheses of every pair,
+solved in normalized coordinates as one batch of closed form 4-point homographies and scored by the truncated
+squared reprojection error (MSAC) of the matches of the pair. A pair stops when it reached the iterations its best
+inlier ratio needs for the confidence, or the iteration budget. The best hypothesis is refined by least squares
+DLT on its inliers (local optimization). Pairs of similar size are processed together in blocks of bounded memory.
+"""
+
+import zlib
+import numpy as np
+import cv2
+
+
+def magsac_homography(p1s, p2s, threshold=3, max_iterations=5000, confidence=0.9999):
+    """
+    Homography from p1s to p2s and inlier mask of MAGSAC, (None, empty mask) if it fails
+    """
+    try:
+        H_pred, inliers = cv2.findHomography(p1s, p2s, cv2.USAC_MAGSAC, ransacReprojThreshold=threshold, maxIters=max_iterations, confidence=confidence)
+    except:
+        H_pred = None
+        inliers = np.zeros(0)
+    return H_pred, inliers
+
+
+def corner_error(H_pred, h_gt, image_size):
+    """
+    Borrowed from https://github.com/GrumpyZhou/image-matching-toolbox hpatches_helper
+
+    Mean distance of the corners of image1 warped with the estimated and the GT homography, image_size is the
+    (width, height) of image1. inf if no homography was found.
+    """
+    if H_pred is None:
+        return np.inf
+
+    w, h = image_size
+    corners = np.array([[0, 0, 1],
+                        [0, w - 1, 1],
+                        [h - 1, 0, 1],
+                        [h - 1, w - 1, 1]])
+    real_warped_corners = np.dot(corners, np.transpose(h_gt))
+    real_warped_corners = real_warped_corners[:, :2] / real_warped_corners[:, 2:]           # convert back to cartesian coordinates ?
+    warped_corners = np.dot(corners, np.transpose(H_pred))
+    warped_corners = warped_corners[:, :2] / warped_corners[:, 2:]                          # convert back to cartesian coordinates ?
+    return np.mean(np.linalg.norm(real_warped_corners - warped_corners, axis=1))
+
+
+def normalization(points, mask):
+    """
+    Similarity transforms (b, 3, 3) moving the valid points of every pair to their centroid with a mean distance of sqrt(2)
+    """
+    count = np.maximum(mask.sum(1), 1)[:, np.newaxis]
+    mean = (points * mask[..., np.newaxis]).sum(1) / count
+    distance = (np.linalg.norm(points - mean[:, np.newaxis], axis=2) * mask).sum(1, keepdims=True) / count
+    scale = np.sqrt(2) / np.maximum(distance, 1e-12)
+    transforms = np.zeros((points.shape[0], 3, 3))
+    transforms[:, 0, 0] = transforms[:, 1, 1] = scale[:, 0]
+    transforms[:, :2, 2] = -scale * mean
+    transforms[:, 2, 2] = 1
+    return transforms
+
+
+def dlt_rows(src, dst):
+    """
+    The two rows of the DLT system of every correspondence, (..., 2 * points, 9) for points (..., points, 2)
+    """
+    x, y, u, v = src[..., 0], src[..., 1], dst[..., 0], dst[..., 1]
+    zeros, ones = np.zeros_like(x), np.ones_like(x)
+    rows = np.stack([np.stack([-x, -y, -ones, zeros, zeros, zeros, u * x, u * y, u], -1),
+                     np.stack([zeros, zeros, zeros, -x, -y, -ones, v * x, v * y, v], -1)], -2)
+    return rows.reshape(src.shape[:-2] + (2 * src.shape[-2], 9))
+
+
+def transfer_errors(H, src, dst):
+    """
+    Squared reprojection errors of src mapped with H against dst, H (..., 3, 3) and points (..., points, 2)
+    """
+    denominator = H[..., 2, 0, np.newaxis] * src[..., 0] + H[..., 2, 1, np.newaxis] * src[..., 1] + H[..., 2, 2, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (H[..., 0, 0, np.newaxis] * src[..., 0] + H[..., 0, 1, np.newaxis] * src[..., 1] + H[..., 0, 2, np.newaxis]) / denominator
+        y = (H[..., 1, 0, np.newaxis] * src[..., 0] + H[..., 1, 1, np.newaxis] * src[..., 1] + H[..., 1, 2, np.newaxis]) / denominator
+        errors = (x - dst[..., 0]) ** 2 + (y - dst[..., 1]) ** 2
+    return np.where(np.isnan(errors), np.inf, errors)
+
+
+def adjugate(M):
+    """
+    Adjugates of 3 x 3 matrices (..., 3, 3), the rows are cross products of the columns
+    """
+    return np.stack([np.cross(M[..., :, 1], M[..., :, 2]), np.cross(M[..., :, 2], M[..., :, 0]), np.cross(M[..., :, 0], M[..., :, 1])], -2)
+
+
+def minimal_homographies(src, dst):
+    """
+    Exact homographies of minimal sets, (..., 3, 3) for points (..., 4, 2). Every set of 4 points is mapped to the
+    projective basis with the adjugate instead of the inverse, so a degenerate set gives a degenerate homography
+    instead of an error.
+    """
+    def basis(points):
+        points = np.concatenate([points, np.ones(points.shape[:-1] + (1,))], -1)
+        M = np.swapaxes(points[..., :3, :], -1, -2)
+        scale = np.einsum('...ij,...j->...i', adjugate(M), points[..., 3, :])
+        return M * scale[..., np.newaxis, :]
+    return basis(dst) @ adjugate(basis(src))
+
+
+def least_squares_dlt(src, dst, weights):
+    """
+    Homographies (b, 3, 3) minimizing the algebraic error of the weighted correspondences of every pair
+    """
+    rows = dlt_rows(src, dst) * np.repeat(weights, 2, axis=1)[..., np.newaxis]
+    _, vectors = np.linalg.eigh(np.swapaxes(rows, 1, 2) @ rows)
+    return vectors[:, :, 0].reshape(-1, 3, 3)
+
+
+def draw(rngs, counts, shape):
+    """
+    Random indices below counts[i] of the shape from the generator of every pair, (b,) + shape
+    """
+    return (np.stack([rng.random(shape) for rng in rngs]) * counts.reshape((-1,) + (1,) * len(shape))).astype(np.int64)
+
+
+def sample_minimal_sets(rngs, counts, hypotheses, resamples=10):
+    """
+    Indices (b, hypotheses, 4) of random minimal sets of every pair with counts[i] points, a set with a repeated
+    index left after the resamples is marked invalid. Returns the indices and the mask of valid sets.
+    """
+    samples = draw(rngs, counts, (hypotheses, 4))
+    for _ in range(resamples + 1):
+        repeated = np.zeros(samples.shape[:2], dtype=bool)
+        for a, b in [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]:
+            repeated |= samples[..., a] == samples[..., b]
+        if not repeated.any():
+            break
+        redraw = draw(rngs, counts, (hypotheses, 4))
+        samples[repeated] = redraw[repeated]
+    return samples, ~repeated
+
+
+def ransac_block(src, dst, mask, rngs, threshold, max_iterations, confidence, hypotheses, local_iterations, preview, keep):
+    """
+    Estimates the homographies of a block of pairs padded to the same number of points, returns the homographies
+    (b, 3, 3) in pixel coordinates normalized to H[2, 2] = 1 and the inlier masks (b, points)
+    """
+    num_pairs = src.shape[0]
+    counts = mask.sum(1)
+    # the hypotheses of a round are ranked on the same random points of every pair, only the best are scored on all points
+    if preview < src.shape[1]:
+        preview_index = np.arange(num_pairs)[:, np.newaxis], draw(rngs, counts, (preview,))
+        src_preview, dst_preview = src[preview_index], dst[preview_index]
+    else:
+        keep = hypotheses
+    t_src, t_dst = normalization(src, mask), normalization(dst, mask)
+    src_n = np.einsum('bij,bnj->bni', t_src[:, :2, :2], src) + t_src[:, np.newaxis, :2, 2]
+    dst_n = np.einsum('bij,bnj->bni', t_dst[:, :2, :2], dst) + t_dst[:, np.newaxis, :2, 2]
+    t_dst_inverse = np.linalg.inv(t_dst)
+    threshold2 = threshold ** 2
+
+    best_H = np.tile(np.eye(3), (num_pairs, 1, 1))
+    best_score = np.full(num_pairs, np.inf)
+    best_inliers = np.zeros(num_pairs)
+    iterations = np.zeros(num_pairs, dtype=np.int64)
+    active = np.ones(num_pairs, dtype=bool)
+
+    while active.any():
+        pairs = np.flatnonzero(active)
+        samples, valid = sample_minimal_sets([rngs[j] for j in pairs], counts[pairs], hypotheses)
+        index = pairs[:, np.newaxis, np.newaxis]
+        H = minimal_homographies(src_n[index, samples], dst_n[index, samples])             # (pairs, hypotheses, 3, 3)
+        H = t_dst_inverse[pairs, np.newaxis] @ H @ t_src[pairs, np.newaxis]                    # back to pixel coordinates
+
+        if keep < hypotheses:
+            score = np.minimum(transfer_errors(H, src_preview[pairs, np.newaxis], dst_preview[pairs, np.newaxis]), threshold2).sum(2)
+            score[~valid] = np.inf
+            ranked = np.argpartition(score, keep - 1, 1)[:, :keep]
+            H = H[np.arange(len(pairs))[:, np.newaxis], ranked]
+            valid = valid[np.arange(len(pairs))[:, np.newaxis], ranked]
+
+        # MSAC score over the valid points of every pair
+        errors = transfer_errors(H, src[pairs, np.newaxis], dst[pairs, np.newaxis])
+        score = np.where(mask[pairs, np.newaxis], np.minimum(errors, threshold2), 0).sum(2)
+        score[~valid] = np.inf
+        inliers = ((errors <= threshold2) & mask[pairs, np.newaxis]).sum(2)
+
+        best = np.argmin(score, 1)
+        improved = score[np.arange(len(pairs)), best] < best_score[pairs]
+        best_score[pairs[improved]] = score[np.arange(len(pairs)), best][improved]
+        best_H[pairs[improved]] = H[np.arange(len(pairs)), best][improved]
+        best_inliers[pairs[improved]] = inliers[np.arange(len(pairs)), best][improved]
+        iterations[pairs] += hypotheses
+
+        # iterations needed for the confidence with the inlier ratio of the best hypothesis
+        ratio = best_inliers[pairs] / counts[pairs]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            needed = np.where(ratio >= 1, 0, np.log(1 - confidence) / np.log(1 - ratio ** 4))
+        active[pairs] = iterations[pairs] < np.minimum(max_iterations, needed)
+
+    # local optimization, least squares on the inliers as long as the score improves
+    for _ in range(local_iterations):
+        inliers = (transfer_errors(best_H, src, dst) <= threshold2) & mask
+        refined = least_squares_dlt(src_n, dst_n, inliers.astype(float))
+        refined = t_dst_inverse @ refined @ t_src
+        errors = transfer_errors(refined, src, dst)
+        score = np.where(mask, np.minimum(errors, threshold2), 0).sum(1)
+        improved = (score < best_score) & (inliers.sum(1) >= 4)
+        if not improved.any():
+            break
+        best_H[improved] = refined[improved]
+        best_score[improved] = score[improved]
+
+    best_H[np.isinf(best_score)] = np.nan     # no valid hypothesis
+    with np.errstate(divide='ignore', invalid='ignore'):
+        best_H = best_H / best_H[:, 2:, 2:]
+    return best_H, (transfer_errors(best_H, src, dst) <= threshold2) & mask
+
+
+def ransac_homographies(point_pairs, threshold=3, max_iterations=5000, confidence=0.9999, hypotheses=64,
+                        local_iterations=3, preview=128, keep=4, seed=0, max_elements=2**22):
+    """
+    Estimates the homographies of a list of (p1s, p2s) matched points like magsac_homography, batched over pairs
+    and hypotheses. Returns (homography or None, inlier mask (n, 1) uint8) for every pair, pairs with less than
+    4 matches get (None, empty mask). Of the hypotheses of a round, the keep best on preview points of the pair are
+    scored on all its points. Every pair samples from its own generator seeded with the seed and its points, so its
+    hypotheses do not depend on the other pairs it is estimated with.
+    """
+    results = [(None, np.zeros(0)) for _ in point_pairs]
+    sizes = np.array([p1s.shape[0] for p1s, _ in point_pairs], dtype=np.int64)
+    order = [i for i in np.argsort(sizes, kind='stable') if sizes[i] >= 4]
+
+    # blocks of pairs with similar numbers of matches, the errors of a round take at most max_elements
+    def round_elements(points):
+        if preview < points:
+            return hypotheses * preview + min(keep, hypotheses) * points
+        return hypotheses * points
+
+    start = 0
+    while start < len(order):
+        end = start + 1
+        while end < len(order) and (end + 1 - start) * round_elements(sizes[order[end]]) <= max_elements:
+            end += 1
+        block = order[start:end]
+        points = sizes[block[-1]]
+
+        src = np.zeros((len(block), points, 2))
+        dst = np.zeros((len(block), points, 2))
+        mask = np.zeros((len(block), points), dtype=bool)
+        rngs = []
+        for j, i in enumerate(block):
+            p1s, p2s = point_pairs[i]
+            rngs.append(np.random.default_rng([seed, zlib.crc32(np.ascontiguousarray(p1s).tobytes()), zlib.crc32(np.ascontiguousarray(p2s).tobytes())]))
+            src[j, :sizes[i]] = np.asarray(p1s, dtype=np.float64).reshape(-1, 2)
+            dst[j, :sizes[i]] = np.asarray(p2s, dtype=np.float64).reshape(-1, 2)
+            mask[j, :sizes[i]] = True
+
+        H, inliers = ransac_block(src, dst, mask, rngs, threshold, max_iterations, confidence, hypotheses, local_iterations,
+                                   preview, keep)
+        for j, i in enumerate(block):
+            if np.all(np.isfinite(H[j])):
+                results[i] = (H[j], inliers[j, :sizes[i], np.newaxis].astype(np.uint8))
+        start = end
+    return results
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-pair completion manifest and atomic file writes, used to resume interrupted runs.
+
+The manifest is an append-only file with one json line per finished pair, keyed by the pair.
+A pair is skipped on a restart if its entry matches the current configuration, the fingerprints
+of its input files and its outputs still exist.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+
+
+def file_fingerprint(*paths):
+    """
+    Fingerprint of files from their size and modification time, changes if any file is rewritten
+    """
+    stats = [os.stat(path) for path in paths]
+    return ','.join(f'{stat.st_size}-{stat.st_mtime_ns}' for stat in stats)
+
+
+def config_fingerprint(config):
+    """
+    Fingerprint of a json serializable configuration, e.g. the algorithm name and its parameters
+    """
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def load_manifest(manifest_path):
+    """
+    Reads the manifest into a dictionary, the last entry of a pair wins.
+    A line cut off by a killed run is ignored.
+    """
+    manifest = {}
+    if not os.path.exists(manifest_path):
+        return manifest
+
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            manifest[entry['key']] = entry
+    return manifest
+
+
+def is_complete(manifest, key, config, inputs, outputs=()):
+    """
+    Checks if a pair was finished with the same configuration and input files and all its outputs exist
+    """
+    entry = manifest.get(key)
+    return (entry is not None and entry['config'] == config and entry['inputs'] == inputs
+            and all(os.path.exists(output) for output in outputs))
+
+
+def record(manifest_path, key, config, inputs, **values):
+    """
+    Appends a finished pair to the manifest, additional json serializable values are stored with the entry
+    """
+    entry = dict(values, key=key, config=config, inputs=inputs)
+    with open(manifest_path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def atomic_savez(path, compressed=True, **arrays):
+    """
+    Writes an npz file to a temporary file in the same directory and renames it, so a killed run never leaves a partial file.
+    Like np.savez, '.npz' is appended to the path if missing. Returns the final path.
+    """
+    if not path.endswith('.npz'):
+        path += '.npz'
+
+    tmp_path = path + f'.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            if compressed:
+                np.savez_compressed(f, **arrays)
+            else:
+                np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
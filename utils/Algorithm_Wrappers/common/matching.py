@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mutual nearest neighbor matcher with symmetric Lowe's ratio test, shared by the algorithm wrappers.
+
+Float descriptors are matched by cosine similarity of the L2 normalized descriptors, binary descriptors
+(ORB, AKAZE) by Hamming distance on the packed bits. The FLANN matchers search approximate nearest neighbors
+with the same mutual NN and ratio test.
+
+The exact matcher has interchangeable backends (NumPy, torch, OpenCV's BFMatcher), mnn_ratio_sweep_backend
+runs one of them or, with 'auto', the fastest for the size of the descriptor sets from a calibration file.
+torch is optional, without it the torch backend is not available.
+"""
+
+import os
+import json
+import time
+import numpy as np
+import cv2
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+
+
+def normalize_descriptors(descriptors, dtype = np.float32):
+    """
+    L2 normalized float descriptors in dtype (float32 by default), as one copy normalized in place
+    """
+    normalized = np.array(descriptors, dtype=dtype, order='C')
+    normalized /= np.sqrt(np.einsum('ij,ij->i', normalized, normalized))[:, np.newaxis]
+    return normalized
+
+
+def mnn_ratio_sweep(descriptors1, descriptors2, bidirectional = True, max_elements = None):
+    """
+    Mutual NN matches for L2 normalized descriptors together with the ratio of every match.
+
+    The mutual NN set does not depend on the ratio threshold, a match survives every threshold >= its ratio.
+    Filtering the result with ratios <= ratio gives exactly the matches of mnn_ratio_matcher.
+    With max_elements, a larger similarity matrix is computed in blocks by mnn_ratio_sweep_batch.
+    """
+    if max_elements is not None and descriptors1.shape[0] * descriptors2.shape[0] > max_elements:
+        return mnn_ratio_sweep_batch(descriptors1, [descriptors2], bidirectional=bidirectional, max_elements=max_elements)[0]
+
+    device = descriptors1.device
+    sim = descriptors1 @ descriptors2.t()
+
+    # Retrieve top 2 nearest neighbors 1->2.
+    nns_sim, nns = torch.topk(sim, 2, dim=1)
+    nns_dist = 2 - 2 * nns_sim
+    # Compute Lowe's ratio.
+    ratios12 = nns_dist[:, 0] / (nns_dist[:, 1] + 1e-8)
+    # Save first NN and match similarity.
+    nn12 = nns[:, 0]
+    match_sim = nns_sim[:, 0]
+
+    # Retrieve top 2 nearest neighbors 2->1.
+    nns_sim, nns = torch.topk(sim.t(), 2, dim=1)
+    nns_dist = 2 - 2 * nns_sim
+    # Compute Lowe's ratio.
+    ratios21 = nns_dist[:, 0] / (nns_dist[:, 1] + 1e-8)
+    # Save first NN.
+    nn21 = nns[:, 0]
+
+    # if not bidirectional, do not use ratios from 2 to 1
+    ratios21[:] *= 1 if bidirectional else 0
+
+    # Mutual NN, a match passes the symmetric ratio test for every threshold >= max(ratios12, ratios21)
+    ids1 = torch.arange(0, sim.shape[0], device=device)
+    mask = ids1 == nn21[nn12]
+    ratios = torch.max(ratios12, ratios21[nn12])[mask]
+    # Final matches.
+    matches = torch.stack([ids1[mask], nn12[mask]], dim=-1)
+    match_sim = match_sim[mask]
+
+    return (matches.data.cpu().numpy(), match_sim.data.cpu().numpy(), ratios.data.cpu().numpy())
+
+
+def top2(sim):
+    """
+    torch.topk of 2 along the rows, rows with less than 2 columns are padded with -inf and index -1
+    """
+    values, indices = torch.topk(sim, min(2, sim.shape[1]), dim=1)
+    if values.shape[1] < 2:
+        padding = (values.shape[0], 2 - values.shape[1])
+        values = torch.cat([values, values.new_full(padding, -float('inf'))], dim=1)
+        indices = torch.cat([indices, indices.new_full(padding, -1)], dim=1)
+    return values, indices
+
+
+def lowe_ratios(nns_sim):
+    """
+    Lowe's ratio of the nearest and second nearest distance from the top 2 similarities, 1 without a second neighbor
+    """
+    nns_dist = 2 - 2 * nns_sim
+    return torch.where(torch.isinf(nns_dist[:, 1]), torch.ones_like(nns_dist[:, 0]), nns_dist[:, 0] / (nns_dist[:, 1] + 1e-8))
+
+
+def top2_merge(values, indices, new_values, new_indices):
+    """
+    Running top 2 of every row, merged with the top 2 of a new block
+    """
+    values, order = torch.topk(torch.cat([values, new_values], dim=1), 2, dim=1)
+    return values, torch.gather(torch.cat([indices, new_indices], dim=1), 1, order)
+
+
+def mnn_ratio_sweep_batch(descriptors1, descriptors2_list, bidirectional = True, max_elements = 2**26, min_rows = 128):
+    """
+    mnn_ratio_sweep of one reference descriptor set against several target sets, e.g. image 1 of a sequence
+    against images 2-6. The similarities to all targets come from one matmul with the concatenated targets,
+    the top 2 reductions run per target segment (1->2) and over all targets at once (2->1).
+    Targets are split into several batches if the similarity matrix would exceed max_elements. A batch that is
+    still larger (a single target with many keypoints) is computed in blocks of reference rows with at most
+    max_elements similarities, but at least min_rows rows: the 1->2 neighbors come from complete rows, the
+    2->1 top 2 are merged over the blocks. Peak memory is bounded by the block, not by the number of keypoints.
+    Returns a list with (matches, match_sim, ratios) of every target, equal to mnn_ratio_sweep. With blocks, only
+    the choice among exactly equal neighbors (duplicate descriptors) may differ, topk does not define it.
+    Targets with less than 2 descriptors are matched like mnn_from_top2 does, a missing second neighbor gives the ratio 1.
+    """
+    device = descriptors1.device
+    ids1 = torch.arange(0, descriptors1.shape[0], device=device)
+
+    # greedy batches of consecutive targets, every batch has at least one target
+    batches = [[]]
+    for i, descriptors2 in enumerate(descriptors2_list):
+        batch_length = sum(descriptors2_list[j].shape[0] for j in batches[-1])
+        if batches[-1] and descriptors1.shape[0] * (batch_length + descriptors2.shape[0]) > max_elements:
+            batches.append([])
+        batches[-1].append(i)
+
+    results = []
+    for batch in batches:
+        lengths = [descriptors2_list[i].shape[0] for i in batch]
+        offsets = [sum(lengths[:k]) for k in range(len(lengths))]
+        descriptors2 = torch.cat([descriptors2_list[i] for i in batch])
+
+        # blocks of reference rows differing by at most one row, a matmul of very few rows can round differently
+        num_blocks = max(1, -(-descriptors1.shape[0] // max(min_rows, max_elements // max(descriptors2.shape[0], 1))))
+        bounds = [descriptors1.shape[0] * k // num_blocks for k in range(num_blocks + 1)]
+
+        nns12 = [[] for _ in batch]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            sim = descriptors1[start:end] @ descriptors2.t()
+
+            # Top 2 nearest neighbors 2->1 for the descriptors of all targets, merged with the previous blocks.
+            nns_sim, nns = top2(sim.t())
+            if start == 0:
+                nns21_sim, nns21 = nns_sim, nns
+            else:
+                nns21_sim, nns21 = top2_merge(nns21_sim, nns21, nns_sim, torch.where(nns >= 0, nns + start, nns))
+
+            # Top 2 nearest neighbors 1->2 within the segment of every target.
+            for k, (offset, length) in enumerate(zip(offsets, lengths)):
+                nns12[k].append(top2(sim[:, offset:offset + length]))
+            del sim
+
+        # Compute Lowe's ratio 2->1.
+        ratios21 = lowe_ratios(nns21_sim)
+        nn21 = nns21[:, 0]
+        ratios21[:] *= 1 if bidirectional else 0
+
+        for offset, blocks in zip(offsets, nns12):
+            nns_sim = torch.cat([block_sim for block_sim, _ in blocks])
+            nns = torch.cat([block_nns for _, block_nns in blocks])
+            ratios12 = lowe_ratios(nns_sim)
+            nn12 = nns[:, 0]
+            match_sim = nns_sim[:, 0]
+
+            # Mutual NN within the target, as in mnn_ratio_sweep
+            found = nn12 >= 0
+            mask = found.clone()
+            mask[found] = ids1[found] == nn21[offset + nn12[found]]
+            ratios = torch.max(ratios12[mask], ratios21[offset + nn12[mask]])
+            matches = torch.stack([ids1[mask], nn12[mask]], dim=-1)
+
+            results.append((matches.data.cpu().numpy(), match_sim[mask].data.cpu().numpy(), ratios.data.cpu().numpy()))
+
+    return results
+
+
+def pack_words(descriptors):
+    """
+    Binary descriptors (uint8, n x bytes) as 64 bit words, zero padded to whole words
+    """
+    words = np.zeros((descriptors.shape[0], -(-descriptors.shape[1] // 8) * 8), dtype=np.uint8)
+    words[:, :descriptors.shape[1]] = descriptors
+    return words.view(np.uint64)
+
+
+def hamming_distances(words1, words2):
+    """
+    Hamming distances between all rows of two packed descriptor arrays as an n1 x n2 uint16 array.
+    With numpy's popcount (bitwise_count, numpy >= 2.0) the XOR of every 64 bit word is counted and accumulated.
+    Older numpy versions have no vectorized popcount, there the bits are matched as +-1 vectors in one float32
+    matmul, hamming = (bits - s1 . s2) / 2, which is exact for descriptors of up to 2^24 bits.
+    """
+    if not hasattr(np, 'bitwise_count'):
+        signs1 = np.unpackbits(words1.view(np.uint8), axis=1).astype(np.float32) * 2 - 1
+        signs2 = np.unpackbits(words2.view(np.uint8), axis=1).astype(np.float32) * 2 - 1
+        return ((signs1.shape[1] - signs1 @ signs2.T) / 2).astype(np.uint16)
+
+    # word by word on contiguous columns into reused buffers, in tiles of rows that stay in the cache
+    words1, words2 = np.ascontiguousarray(words1.T), np.ascontiguousarray(words2.T)
+    distances = np.zeros((words1.shape[1], words2.shape[1]), dtype=np.uint16)
+    tile = 64
+    xor = np.empty((tile, words2.shape[1]), dtype=np.uint64)
+    count = np.empty((tile, words2.shape[1]), dtype=np.uint8)
+    for start in range(0, words1.shape[1], tile):
+        rows = distances[start:start + tile]
+        for k in range(words1.shape[0]):
+            np.bitwise_xor(words1[k, start:start + tile, np.newaxis], words2[k, np.newaxis, :], out=xor[:rows.shape[0]])
+            np.bitwise_count(xor[:rows.shape[0]], out=count[:rows.shape[0]])
+            np.add(rows, count[:rows.shape[0]], out=rows)
+    return distances
+
+
+def top2_smallest(distances):
+    """
+    Smallest and second smallest distance of every row and the index of the smallest (the first one for ties).
+    With less than 2 columns the missing neighbors have index -1 and an infinite distance, as in mnn_from_top2.
+    """
+    rows = np.arange(distances.shape[0])
+    missing = np.full(distances.shape[0], np.inf, dtype=np.float32)
+    if distances.shape[1] == 0:
+        return np.full(distances.shape[0], -1, dtype=np.int64), missing, missing.copy()
+    nn = np.argmin(distances, axis=1)
+    first = distances[rows, nn]
+    if distances.shape[1] == 1:
+        return nn, first.astype(np.float32), missing
+    distances[rows, nn] = np.iinfo(distances.dtype).max
+    second = np.min(distances, axis=1)
+    distances[rows, nn] = first
+    return nn, first.astype(np.float32), second.astype(np.float32)
+
+
+def mnn_ratio_sweep_hamming_words(words1, words2, bidirectional = True):
+    """
+    mnn_ratio_sweep_hamming for descriptors packed with pack_words
+    """
+    distances = hamming_distances(words1, words2)
+
+    # Retrieve top 2 nearest neighbors 1->2 and 2->1, the ratio of two zero distances is 0
+    nn12, first12, second12 = top2_smallest(distances)
+    nn21, first21, second21 = top2_smallest(distances.T)
+    matches, ratios, mask = mnn_from_top2(nn12, first12, second12, nn21, first21, second21, bidirectional)
+
+    return (matches, first12[mask], ratios)
+
+
+def mnn_from_top2(nn12, first12, second12, nn21, first21, second21, bidirectional = True):
+    """
+    Mutual NN matches and their ratios from the nearest and second nearest distances (squared L2 or Hamming) of
+    both directions. A missing nearest neighbor has index -1, a missing second neighbor an infinite distance and
+    the ratio 1. Returns (matches, ratios, mask of the matched descriptors of 1).
+    """
+    with np.errstate(invalid='ignore'):
+        ratios12 = np.where(np.isinf(second12), 1.0, first12 / (second12 + 1e-8))
+        ratios21 = np.where(np.isinf(second21), 1.0, first21 / (second21 + 1e-8))
+
+    # if not bidirectional, do not use ratios from 2 to 1
+    ratios21[:] *= 1 if bidirectional else 0
+
+    # Mutual NN, a match passes the symmetric ratio test for every threshold >= max(ratios12, ratios21)
+    ids1 = np.arange(nn12.shape[0])
+    mask = nn12 >= 0
+    mask[mask] = ids1[mask] == nn21[nn12[mask]]
+    ratios = np.maximum(ratios12[mask], ratios21[nn12[mask]])
+    matches = np.stack([ids1[mask], nn12[mask]], axis=-1)
+
+    return matches, ratios, mask
+
+
+def mnn_ratio_sweep_hamming(descriptors1, descriptors2, bidirectional = True):
+    """
+    Mutual NN matches for binary descriptors (uint8) by Hamming distance, together with the ratio of every match.
+    The ratio is first / second nearest Hamming distance, the Hamming distance is the squared L2 distance of the bits
+    like the squared distances of mnn_ratio_sweep. Returns (matches, match_distances, ratios).
+    """
+    return mnn_ratio_sweep_hamming_words(pack_words(descriptors1), pack_words(descriptors2), bidirectional=bidirectional)
+
+
+def mnn_ratio_sweep_hamming_batch(descriptors1, descriptors2_list, bidirectional = True):
+    """
+    mnn_ratio_sweep_hamming of one reference descriptor set against several target sets, the reference is packed once.
+    Returns a list with (matches, match_distances, ratios) of every target.
+    """
+    words1 = pack_words(descriptors1)
+    return [mnn_ratio_sweep_hamming_words(words1, pack_words(descriptors2), bidirectional=bidirectional) for descriptors2 in descriptors2_list]
+
+
+def flann_index(descriptors, trees = 4):
+    """
+    Approximate nearest neighbor index of FLANN, randomized KD-trees for float32 descriptors and LSH with `trees`
+    hash tables for binary (uint8) descriptors
+    """
+    if descriptors.dtype == np.uint8:
+        return cv2.flann_Index(descriptors, dict(algorithm=FLANN_INDEX_LSH, table_number=trees, key_size=20, multi_probe_level=2))
+    return cv2.flann_Index(descriptors, dict(algorithm=FLANN_INDEX_KDTREE, trees=trees))
+
+
+def flann_top2(index, queries, checks = 32):
+    """
+    Approximate nearest and second nearest neighbor of every query, checking `checks` leaves of the index.
+    Returns the index of the nearest and both squared L2 (Hamming for LSH) distances, a neighbor LSH did not find
+    has index -1 and an infinite distance.
+    """
+    nns, distances = index.knnSearch(queries, 2, params=dict(checks=checks))
+    distances = distances.astype(np.float32)
+    distances[nns < 0] = np.inf
+    return nns[:, 0].astype(np.int64), distances[:, 0], distances[:, 1]
+
+
+def mnn_ratio_sweep_flann_batch(descriptors1, descriptors2_list, bidirectional = True, trees = 4, checks = 32):
+    """
+    Approximate mnn_ratio_sweep_batch for L2 normalized float32 descriptors, or mnn_ratio_sweep_hamming_batch for
+    binary descriptors, with the nearest neighbors searched in FLANN indices instead of all pairs of descriptors.
+    The index of the reference is built once for the 2->1 search of all targets. More trees and checks find more
+    of the exact nearest neighbors and take longer.
+    Returns a list with (matches, match_sim or match_distances, ratios) of every target.
+    """
+    index1 = flann_index(descriptors1, trees)
+    results = []
+    for descriptors2 in descriptors2_list:
+        nn12, first12, second12 = flann_top2(flann_index(descriptors2, trees), descriptors1, checks)
+        nn21, first21, second21 = flann_top2(index1, descriptors2, checks)
+        matches, ratios, mask = mnn_from_top2(nn12, first12, second12, nn21, first21, second21, bidirectional)
+
+        # similarity of normalized descriptors from their squared distance, as in mnn_ratio_sweep
+        match_values = first12[mask] if descriptors1.dtype == np.uint8 else 1 - first12[mask] / 2
+        results.append((matches, match_values, ratios))
+
+    return results
+
+
+def top2_largest(similarities):
+    """
+    Largest and second largest similarity of every row and the index of the largest (the first one for ties).
+    A missing neighbor has the similarity -inf, the one of an empty row also the index -1.
+    """
+    rows = np.arange(similarities.shape[0])
+    if similarities.shape[1] == 0:
+        missing = np.full(similarities.shape[0], -np.inf, dtype=similarities.dtype)
+        return np.full(similarities.shape[0], -1, dtype=np.int64), missing, missing.copy()
+    nn = np.argmax(similarities, axis=1)
+    first = similarities[rows, nn]
+    similarities[rows, nn] = -np.inf
+    second = np.max(similarities, axis=1)
+    similarities[rows, nn] = first
+    return nn, first, second
+
+
+def mnn_ratio_sweep_numpy_batch(descriptors1, descriptors2_list, bidirectional = True, max_elements = 2**26, min_rows = 128):
+    """
+    mnn_ratio_sweep_batch with NumPy's matmul (BLAS) in the dtype of the descriptors. The similarities to all
+    targets are computed in blocks of reference rows with at most max_elements (but at least min_rows rows),
+    the 2->1 top 2 are merged over the blocks.
+    """
+    lengths = [descriptors2.shape[0] for descriptors2 in descriptors2_list]
+    offsets = [sum(lengths[:k]) for k in range(len(lengths))]
+    descriptors2 = np.concatenate(descriptors2_list)
+
+    num_blocks = max(1, -(-descriptors1.shape[0] // max(min_rows, max_elements // max(descriptors2.shape[0], 1))))
+    bounds = [descriptors1.shape[0] * k // num_blocks for k in range(num_blocks + 1)]
+
+    top12 = [[] for _ in lengths]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        sim = descriptors1[start:end] @ descriptors2.T
+
+        # Top 2 nearest neighbors 2->1, merged with the previous blocks, an equal later neighbor does not replace an earlier one
+        nn, first, second = top2_largest(sim.T)
+        if start == 0:
+            nn21, first21, second21 = nn, first, second
+        else:
+            better = first > first21
+            nn21 = np.where(better, nn + start, nn21)
+            second21 = np.where(better, np.maximum(first21, second), np.maximum(second21, first))
+            first21 = np.maximum(first21, first)
+
+        # Top 2 nearest neighbors 1->2 within the segment of every target
+        for k, (offset, length) in enumerate(zip(offsets, lengths)):
+            top12[k].append(top2_largest(sim[:, offset:offset + length]))
+
+    results = []
+    for offset, length, blocks in zip(offsets, lengths, top12):
+        nn12, first12, second12 = [np.concatenate(values) for values in zip(*blocks)]
+        matches, ratios, mask = mnn_from_top2(nn12, 2 - 2 * first12, 2 - 2 * second12, nn21[offset:offset + length],
+                                              2 - 2 * first21[offset:offset + length], 2 - 2 * second21[offset:offset + length], bidirectional)
+        results.append((matches, first12[mask], ratios))
+    return results
+
+
+def bf_top2(matcher, queries, train, squared = True):
+    """
+    Nearest and second nearest neighbor of every query by OpenCV's brute force knnMatch, with the distances squared
+    (L2) or not (Hamming). Returns the index of the nearest and both distances, knnMatch returns less than 2
+    neighbors for a train set with less than 2 descriptors, a missing neighbor has index -1 and an infinite distance.
+    """
+    knn = matcher.knnMatch(queries, train, k=2)
+    nns = np.full(queries.shape[0], -1, dtype=np.int64)
+    distances = np.full((queries.shape[0], 2), np.inf, dtype=np.float32)
+    for i, neighbors in enumerate(knn):
+        for k, neighbor in enumerate(neighbors[:2]):
+            distances[i, k] = neighbor.distance
+        if neighbors:
+            nns[i] = neighbors[0].trainIdx
+    if squared:
+        distances **= 2
+    return nns, distances[:, 0], distances[:, 1]
+
+
+def mnn_ratio_sweep_opencv_batch(descriptors1, descriptors2_list, bidirectional = True):
+    """
+    mnn_ratio_sweep_batch with OpenCV's BFMatcher, L2 distances of float32 descriptors or Hamming distances of binary
+    descriptors. Returns a list with (matches, match_sim or match_distances, ratios) of every target.
+    """
+    binary = descriptors1.dtype == np.uint8
+    matcher = cv2.BFMatcher(cv2.NORM_HAMMING if binary else cv2.NORM_L2)
+    if not binary:
+        descriptors1 = np.float32(descriptors1)
+        descriptors2_list = [np.float32(descriptors2) for descriptors2 in descriptors2_list]
+
+    results = []
+    for descriptors2 in descriptors2_list:
+        nn12, first12, second12 = bf_top2(matcher, descriptors1, descriptors2, not binary)
+        nn21, first21, second21 = bf_top2(matcher, descriptors2, descriptors1, not binary)
+        matches, ratios, mask = mnn_from_top2(nn12, first12, second12, nn21, first21, second21, bidirectional)
+        results.append((matches, first12[mask] if binary else 1 - first12[mask] / 2, ratios))
+    return results
+
+
+def numpy_backend(descriptors1, descriptors2_list, bidirectional, max_elements):
+    if descriptors1.dtype == np.uint8:
+        return mnn_ratio_sweep_hamming_batch(descriptors1, descriptors2_list, bidirectional=bidirectional)
+    return mnn_ratio_sweep_numpy_batch(descriptors1, descriptors2_list, bidirectional=bidirectional, max_elements=max_elements)
+
+
+def torch_backend(descriptors1, descriptors2_list, bidirectional, max_elements):
+    return mnn_ratio_sweep_batch(torch.as_tensor(descriptors1), [torch.as_tensor(descriptors2) for descriptors2 in descriptors2_list],
+                                 bidirectional=bidirectional, max_elements=max_elements)
+
+
+def opencv_backend(descriptors1, descriptors2_list, bidirectional, max_elements):
+    return mnn_ratio_sweep_opencv_batch(descriptors1, descriptors2_list, bidirectional=bidirectional)
+
+
+MATCHER_BACKENDS = {'numpy': numpy_backend, 'torch': torch_backend, 'opencv': opencv_backend}
+
+
+def available_backends(dtype):
+    """
+    Backends matching descriptors of a dtype exactly in that dtype, OpenCV only computes float32 distances
+    """
+    if dtype == np.uint8:
+        return ['numpy', 'opencv']
+    return ['numpy'] + (['torch'] if torch is not None else []) + (['opencv'] if dtype == np.float32 else [])
+
+
+def calibration_key(descriptors1, descriptors2_list):
+    """
+    Type and shape of a matching problem, the numbers of descriptors rounded to powers of 2
+    """
+    def bucket(n):
+        return int(2 ** round(np.log2(max(n, 1))))
+    mean_length = np.mean([descriptors2.shape[0] for descriptors2 in descriptors2_list])
+    return f'{descriptors1.dtype}_{bucket(descriptors1.shape[0])}x{len(descriptors2_list)}x{bucket(mean_length)}_{descriptors1.shape[1]}'
+
+
+def calibrate(key, backends, max_elements, repeats = 3):
+    """
+    Best time of every backend out of repeats on random descriptors of the type and shape of a calibration key
+    """
+    dtype, shape, dim = key.split('_')
+    num1, num_targets, num2 = [int(n) for n in shape.split('x')]
+    rng = np.random.default_rng(0)
+
+    def random_descriptors(num):
+        if dtype == 'uint8':
+            return rng.integers(0, 256, (num, int(dim)), dtype=np.uint8)
+        descriptors = rng.normal(size=(num, int(dim)))
+        return (descriptors / np.linalg.norm(descriptors, axis=1)[:, np.newaxis]).astype(dtype)
+    descriptors1 = random_descriptors(num1)
+    descriptors2_list = [random_descriptors(num2) for _ in range(num_targets)]
+
+    times = {}
+    for backend in backends:
+        times[backend] = float('inf')
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            MATCHER_BACKENDS[backend](descriptors1, descriptors2_list, True, max_elements)
+            times[backend] = min(times[backend], time.perf_counter() - start_time)
+    return times
+
+
+_calibrations = {}
+
+
+def select_backend(descriptors1, descriptors2_list, calibration_path = None, max_elements = 2**26):
+    """
+    Fastest available backend for the descriptors. The backends are timed once per type and shape of the problem,
+    the times are kept in the calibration file (if given) for later runs.
+    """
+    backends = available_backends(descriptors1.dtype)
+    if len(backends) == 1:
+        return backends[0]
+
+    if calibration_path not in _calibrations:
+        _calibrations[calibration_path] = {}
+        if calibration_path and os.path.exists(calibration_path):
+            with open(calibration_path) as f:
+                _calibrations[calibration_path] = json.load(f)
+    calibration = _calibrations[calibration_path]
+
+    key = calibration_key(descriptors1, descriptors2_list)
+    if not all(backend in calibration.get(key, {}) for backend in backends):
+        calibration[key] = calibrate(key, backends, max_elements)
+        if calibration_path:
+            # other processes may have added keys in the meantime, the file is replaced atomically
+            if os.path.exists(calibration_path):
+                with open(calibration_path) as f:
+                    calibration.update({k: v for k, v in json.load(f).items() if k != key})
+            tmp_path = calibration_path + '.' + str(os.getpid()) + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(calibration, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, calibration_path)
+
+    return min(backends, key=lambda backend: calibration[key][backend])
+
+
+def pinned_backend(pin_path):
+    """
+    Backend stored in a pin file, None if there is none
+    """
+    if not os.path.exists(pin_path):
+        return None
+    with open(pin_path) as f:
+        return f.read().strip()
+
+
+def pin_backend(pin_path, resolve):
+    """
+    Backend stored in pin_path, if there is none yet the backend returned by resolve() is stored.
+    Processes resolving it at the same time all get the backend stored first.
+    """
+    if not os.path.exists(pin_path):
+        tmp_path = pin_path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(resolve())
+        try:
+            os.link(tmp_path, pin_path)
+        except FileExistsError:
+            pass
+        os.remove(tmp_path)
+    return pinned_backend(pin_path)
+
+
+def mnn_ratio_sweep_backend(descriptors1, descriptors2_list, backend = 'auto', bidirectional = True, max_elements = 2**26, calibration_path = None,
+                            pin_path = None):
+    """
+    mnn_ratio_sweep_batch for NumPy descriptors (L2 normalized float or binary uint8) with a backend of MATCHER_BACKENDS,
+    'auto' selects the fastest one for the descriptors with select_backend. All backends give the same matches and
+    ratios up to the rounding of their arithmetic and the choice among exactly equal neighbors. With a pin_path, 'auto'
+    is resolved once and kept in that file, so that all later calls use the same backend.
+    Returns a list with (matches, match_sim or match_distances, ratios) of every target.
+    """
+    if backend == 'auto' and pin_path:
+        backend = pin_backend(pin_path, lambda: select_backend(descriptors1, descriptors2_list, calibration_path, max_elements))
+    elif backend == 'auto':
+        backend = select_backend(descriptors1, descriptors2_list, calibration_path, max_elements)
+    elif backend == 'torch' and (torch is None or descriptors1.dtype == np.uint8):
+        raise ValueError('the torch backend needs torch and float descriptors')
+    return MATCHER_BACKENDS[backend](descriptors1, descriptors2_list, bidirectional, max_elements)
+
+
+def mnn_ratio_matcher(descriptors1, descriptors2, ratio=0.8, bidirectional = True, max_elements = None):
+    """
+    Mutual NN + symmetric Lowe's ratio test matcher for L2 normalized descriptors.
+    """
+    matches, match_sim, ratios = mnn_ratio_sweep(descriptors1, descriptors2, bidirectional=bidirectional, max_elements=max_elements)
+    mask = ratios <= ratio
+
+    return (matches[mask], match_sim[mask])
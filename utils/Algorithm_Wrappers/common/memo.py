@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process memo of per-image results within a run.
+
+Every image pair of a sequence shares the reference image (<seq>_1 with <seq>_2 ... <seq>_6). With the pairs
+grouped by their reference image, the features of a reference image are computed once per sequence and
+served from the memo for the following pairs. The memo holds a few entries and evicts the least recently used.
+"""
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Dictionary with at most 'capacity' entries, the least recently used entry is evicted first
+    """
+    def __init__(self, capacity=4):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Returns the entry of key and marks it as recently used, None if there is none
+        """
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Image pairs of a dataset and the index of their output files.
+
+A line of image_pairs.txt is 'subset/sequence/p1.ppm subset/sequence/p2.ppm subset/sequence/H_1_2',
+the pair id is 'p1_p2' and its output file is named 'p1_p2_matches.npz'.
+Outputs for the evaluation are stored as <output_dir>/<subset>/<sequence>/p1_p2_matches.npz.
+"""
+
+import os
+from collections import namedtuple
+
+OUTPUT_SUFFIX = '_matches.npz'
+
+ImagePair = namedtuple('ImagePair', ['image1', 'image2', 'homography', 'subset', 'sequence', 'p1', 'p2', 'id', 'name'])
+
+
+def parse_pair(line):
+    """
+    Parses one line of image_pairs.txt, the homography is None for lines with two images only
+    """
+    paths = line.split()
+    subset, sequence, name1 = paths[0].split('/')
+    p1 = name1.split('.')[0]
+    p2 = paths[1].split('/')[2].split('.')[0]
+    homography = paths[2] if len(paths) > 2 else None
+    return ImagePair(paths[0], paths[1], homography, subset, sequence, p1, p2, p1 + '_' + p2, p1 + '_' + p2 + OUTPUT_SUFFIX)
+
+
+def read_pairs(pairs_file):
+    """
+    Reads all image pairs of image_pairs.txt in file order, empty lines are ignored
+    """
+    with open(pairs_file) as f:
+        return [parse_pair(line) for line in f if line.strip()]
+
+
+def group_by_reference(pairs):
+    """
+    Orders the pairs so that pairs with the same first image follow each other, otherwise keeping the file order
+    """
+    first_index = {}
+    for i, pair in enumerate(pairs):
+        first_index.setdefault(pair.image1, i)
+    return sorted(pairs, key=lambda pair: first_index[pair.image1])
+
+
+def group_sequences(pairs):
+    """
+    Lists of the pairs with the same first image, in order of their first pair
+    """
+    sequences = {}
+    for pair in pairs:
+        sequences.setdefault(pair.image1, []).append(pair)
+    return list(sequences.values())
+
+
+def pair_output_path(output_dir, pair):
+    """
+    Path of the output of a pair in the evaluation layout
+    """
+    return output_dir + '/' + pair.subset + '/' + pair.sequence + '/' + pair.name
+
+
+def index_outputs(output_dir):
+    """
+    Maps the pair id of every output file in a directory to its path, with a single directory listing
+    """
+    if not os.path.exists(output_dir):
+        return {}
+    return {name[:-len(OUTPUT_SUFFIX)]: output_dir + '/' + name for name in os.listdir(output_dir) if name.endswith(OUTPUT_SUFFIX)}
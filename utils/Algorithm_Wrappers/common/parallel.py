@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process pool for the pairs of the classical algorithm utils.
+
+The unit of work is a sequence, all pairs with the same reference image, so the reference features are
+extracted once and the sequence is matched with one batched matcher call. Every worker creates its own
+detector with the util's load_model, OpenCV and torch use cpu_count / workers threads per worker to avoid
+oversubscription. Workers are spawned instead of forked, a fork after torch or OpenCV started their thread
+pools can deadlock. The sequence function writes the outputs, the calling process gets the results back and
+keeps the manifest.
+"""
+
+import os
+import multiprocessing
+import cv2
+from pair_index import group_sequences
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+_worker = {}
+
+
+def _init_worker(load_model, args_util, threads):
+    """
+    Pool initializer, creates the detector of a worker
+    """
+    cv2.setNumThreads(threads)
+    if torch is not None:
+        torch.set_num_threads(threads)
+    _worker['args'] = args_util
+    _worker['model'] = load_model(args_util)
+
+
+def _run_sequence(task):
+    """
+    Runs the sequence function in a worker
+    """
+    process_sequence, pairs = task
+    return list(zip(pairs, process_sequence(_worker['args'], _worker['model'], pairs)))
+
+
+def map_sequences(process_sequence, pairs, args_util, model, load_model, workers=1):
+    """
+    Yields (pair, result) for all pairs, process_sequence(args_util, model, sequence_pairs) returns the results
+    of the pairs of one sequence in their order. With workers > 1 the sequences run in a pool of processes with
+    their own model from load_model(args_util), otherwise in this process with the given model.
+    """
+    sequences = group_sequences(pairs)
+    if workers <= 1:
+        for sequence in sequences:
+            for pair, result in zip(sequence, process_sequence(args_util, model, sequence)):
+                yield pair, result
+        return
+
+    threads = max(1, os.cpu_count() // workers)
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker, initargs=(load_model, args_util, threads)) as pool:
+        for results in pool.imap_unordered(_run_sequence, [(process_sequence, sequence) for sequence in sequences]):
+            for pair, result in results:
+                yield pair, result
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Consolidated result store of one run (algorithm, dataset, ratio threshold).
+
+The per-pair outputs are packed into one .npy file per array, with the arrays of all pairs concatenated
+along the first axis. offsets.npy holds the start of every pair in every array (one row per pair plus
+the end) and pairs.json the pair ids, array names and the fingerprints of the packed files.
+The arrays are memory-mapped, so a pair is read as a slice without opening or decompressing a file.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+from manifest import file_fingerprint
+from pair_index import pair_output_path
+
+STORE_ARRAYS = ['pointsA', 'pointsB', 'matches', 'ratios']
+POINT_ARRAYS = ['pointsA', 'pointsB', 'matches']
+
+
+class ResultStore:
+    """
+    Read access to a packed store, store[pair_id] returns a dictionary of read-only array views
+    """
+    def __init__(self, store_dir):
+        with open(store_dir + '/' + 'pairs.json') as f:
+            self.meta = json.load(f)
+        self.index = {pair_id: i for i, pair_id in enumerate(self.meta['pairs'])}
+        self.offsets = np.load(store_dir + '/' + 'offsets.npy')
+        self.arrays = {name: np.load(store_dir + '/' + name + '.npy', mmap_mode='r') for name in self.meta['arrays']}
+
+    def __contains__(self, pair_id):
+        return pair_id in self.index
+
+    def __getitem__(self, pair_id):
+        i = self.index[pair_id]
+        return {name: array[self.offsets[i, j]:self.offsets[i + 1, j]] for j, (name, array) in enumerate(self.arrays.items())}
+
+    def source(self, pair_id):
+        """
+        Fingerprint of the output file the pair was packed from
+        """
+        return self.meta['sources'][self.index[pair_id]]
+
+
+def open_store(store_dir):
+    """
+    Opens the store in store_dir, None if there is none
+    """
+    if not os.path.exists(store_dir + '/' + 'pairs.json'):
+        return None
+    return ResultStore(store_dir)
+
+
+def pack_outputs(outputs_dir, pairs, store_dir, array_names=STORE_ARRAYS):
+    """
+    Packs the existing outputs of the pairs into a store. The store is only rebuilt if a pair was added,
+    removed or rewritten since it was packed. Returns the number of packed pairs.
+    """
+    paths = [(pair.id, pair_output_path(outputs_dir, pair)) for pair in pairs]
+    paths = [(pair_id, path) for pair_id, path in paths if os.path.exists(path)]
+    pair_ids = [pair_id for pair_id, _ in paths]
+    sources = [file_fingerprint(path) for _, path in paths]
+
+    store = open_store(store_dir)
+    if store is not None and store.meta['pairs'] == pair_ids and store.meta['sources'] == sources:
+        return len(pair_ids)
+
+    outputs = [np.load(path) for _, path in paths]
+    names = [name for name in array_names if outputs and all(name in output.files for output in outputs)]
+
+    # points and matches are (n, 2), a pair without any keypoints may be stored flat
+    arrays = {name: [] for name in names}
+    for output in outputs:
+        for name in names:
+            array = output[name]
+            arrays[name].append(array.reshape(-1, 2) if name in POINT_ARRAYS else array.reshape(-1))
+
+    offsets = np.zeros((len(outputs) + 1, len(names)), dtype=np.int64)
+    for j, name in enumerate(names):
+        offsets[1:, j] = np.cumsum([array.shape[0] for array in arrays[name]])
+
+    # write next to the store and swap it in, a killed run leaves the old store intact
+    tmp_dir = store_dir + f'.{os.getpid()}.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for name in names:
+        np.save(tmp_dir + '/' + name + '.npy', np.concatenate(arrays[name]))
+    np.save(tmp_dir + '/' + 'offsets.npy', offsets)
+    with open(tmp_dir + '/' + 'pairs.json', 'w') as f:
+        json.dump({'pairs': pair_ids, 'arrays': names, 'sources': sources}, f)
+
+    # the old store is moved aside before the swap and deleted after it, it is never half removed
+    old_dir = store_dir + f'.{os.getpid()}.old'
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    if os.path.exists(store_dir):
+        os.rename(store_dir, old_dir)
+    os.rename(tmp_dir, store_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    return len(pair_ids)
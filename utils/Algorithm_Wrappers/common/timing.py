@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-pair stage timings of the algorithm wrappers.
+
+Each pair is timed with perf_counter in the stages load (reading images or inputs), detect (keypoints and
+descriptors), match and save. The times are appended to timings.csv next to the outputs, one row per pair
+in seconds; a pair that is processed again gets a new row and the last row counts.
+"""
+
+import os
+import time
+
+STAGES = ['load', 'detect', 'match', 'save']
+
+
+class PairTimer:
+    """
+    Accumulates the time since the last lap into a stage, so consecutive laps cover the whole pair
+    """
+    def __init__(self):
+        self.times = dict.fromkeys(STAGES, 0.0)
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.times[stage] += now - self.last
+        self.last = now
+
+    def add(self, times):
+        """
+        Adds stage times measured elsewhere, e.g. by the util that produced the inputs of a wrapper pass
+        """
+        for stage in STAGES:
+            self.times[stage] += times.get(stage, 0.0)
+
+
+def timings_path(output_dir):
+    """
+    Path of the timings file of an output directory
+    """
+    return output_dir + '/' + 'timings.csv'
+
+
+def record_timings(output_dir, pair_id, timer):
+    """
+    Appends the stage times of a pair to the timings file of the output directory
+    """
+    path = timings_path(output_dir)
+    new_file = not os.path.exists(path)
+    with open(path, 'a') as f:
+        if new_file:
+            f.write(','.join(['pair'] + STAGES + ['total']) + '\n')
+        times = [timer.times[stage] for stage in STAGES]
+        f.write(','.join([pair_id] + [f'{t:.6f}' for t in times + [sum(times)]]) + '\n')
+
+
+def load_timings(output_dir):
+    """
+    Reads the timings file into a dictionary pair id -> {stage: seconds}, empty if there is none
+    """
+    timings = {}
+    path = timings_path(output_dir)
+    if not os.path.exists(path):
+        return timings
+
+    with open(path) as f:
+        header = f.readline().strip().split(',')
+        for line in f:
+            values = line.strip().split(',')
+            if len(values) != len(header):
+                continue
+            timings[values[0]] = {stage: float(value) for stage, value in zip(header[1:], values[1:])}
+    return timings
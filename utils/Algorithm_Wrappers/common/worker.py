@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent worker processes, a pool of them per algorithm environment.
+
+A worker is an algorithm_wrapper_util.py started once with '--serve SOCKET'. It loads its model and then
+runs jobs received over a unix socket, so conda start-up, imports and model loading are paid once per run
+instead of once per dataset and ratio threshold. A job is the argument list of the util's command line,
+requests and replies are single json lines.
+
+A worker runs one job at a time in its own working directory. The workers of an environment share a pool
+directory with one socket each, a job claims an idle worker by locking the lock file of its socket, so as
+many jobs of an algorithm run at once as its pool has workers.
+"""
+
+import os
+import json
+import time
+import fcntl
+import socket
+import traceback
+import subprocess
+import contextlib
+
+
+def serve(socket_path, run_job):
+    """
+    Runs run_job(argument_list) for every request on the socket until a shutdown request, one job at a time.
+    Jobs of the same algorithm run in parallel on the other workers of its pool.
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # the socket appears under its final name only once it accepts connections
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path + '.tmp')
+    server.listen(16)
+    os.rename(socket_path + '.tmp', socket_path)
+    print(f'Worker listening on {socket_path}', flush=True)
+
+    try:
+        while True:
+            connection, _ = server.accept()
+            with connection, connection.makefile('rw') as stream:
+                line = stream.readline()
+                if not line:
+                    continue
+                request = json.loads(line)
+
+                if request.get('command') == 'shutdown':
+                    stream.write(json.dumps({'status': 'ok'}) + '\n')
+                    stream.flush()
+                    break
+
+                # paths of a job are relative to the directory of the client
+                try:
+                    os.chdir(request['cwd'])
+                    run_job(request['args'])
+                    reply = {'status': 'ok'}
+                except (Exception, SystemExit):
+                    reply = {'status': 'error', 'message': traceback.format_exc()}
+                    print(reply['message'], flush=True)
+
+                stream.write(json.dumps(reply) + '\n')
+                stream.flush()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def request(socket_path, message):
+    """
+    Sends one request to a worker and waits for its reply
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile('rw') as stream:
+            stream.write(json.dumps(message) + '\n')
+            stream.flush()
+            reply = stream.readline()
+
+    if not reply:
+        raise RuntimeError(f'worker on {socket_path} closed the connection')
+    return json.loads(reply)
+
+
+def submit(socket_path, args):
+    """
+    Runs a job with the given util arguments on a worker, raises RuntimeError if the job failed
+    """
+    reply = request(socket_path, {'args': [str(arg) for arg in args], 'cwd': os.getcwd()})
+    if reply['status'] != 'ok':
+        raise RuntimeError(f'job failed on worker {socket_path}:\n' + reply['message'])
+
+
+def pool_sockets(pool_dir):
+    """
+    Sockets of the workers of a pool
+    """
+    return sorted(pool_dir + '/' + name for name in os.listdir(pool_dir) if name.endswith('.sock'))
+
+
+@contextlib.contextmanager
+def claim(pool_dir, poll=0.1):
+    """
+    Waits until a worker of the pool is idle and holds it for the block, yields its socket.
+    The lock is released when the block ends or the process exits.
+    """
+    while True:
+        for socket_path in pool_sockets(pool_dir):
+            lock = open(socket_path + '.lock', 'w')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:     # busy with another job
+                lock.close()
+                continue
+            try:
+                yield socket_path
+            finally:
+                lock.close()
+            return
+        time.sleep(poll)
+
+
+def run_util(alg_name, alg_dir, args, worker=None):
+    """
+    Runs the algorithm_wrapper_util.py of an algorithm with the given arguments, on an idle worker of its pool if a pool
+    directory is given, otherwise in a new process with conda run. Raises if the util failed.
+    """
+    if worker:
+        with claim(worker) as socket_path:
+            submit(socket_path, args)
+    else:
+        subprocess.run('conda run -n ' + alg_name + ' python3 ' + alg_dir + '/' + 'algorithm_wrapper_util.py ' + ' '.join(str(arg) for arg in args),
+                       shell=True, check=True)
+
+
+def launch_worker(alg_name, alg_dir, socket_path, log_path):
+    """
+    Starts a worker in the conda environment of an algorithm without waiting for it, its output is written to log_path
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    alg_dir = os.path.abspath(alg_dir)
+    with open(log_path, 'w') as log:
+        return subprocess.Popen('conda run --no-capture-output -n ' + alg_name + ' python3 ' + alg_dir + '/' + 'algorithm_wrapper_util.py' +
+                                ' --alg_dir ' + alg_dir + ' --serve ' + socket_path,
+                                shell=True, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_worker(alg_name, socket_path, process, log_path, timeout=600):
+    """
+    Waits until a launched worker accepts jobs, raises RuntimeError if it exits or does not start in time
+    """
+    start_time = time.time()
+    while not os.path.exists(socket_path):
+        if process.poll() is not None:
+            raise RuntimeError(f'worker {alg_name} exited during start-up, see {log_path}')
+        if time.time() - start_time > timeout:
+            process.kill()
+            raise RuntimeError(f'worker {alg_name} did not start within {timeout}s, see {log_path}')
+        time.sleep(0.1)
+
+
+def start_worker(alg_name, alg_dir, socket_path, log_path, timeout=600):
+    """
+    Starts a worker in the conda environment of an algorithm and waits until it accepts jobs.
+    Returns the worker process, its output is written to log_path.
+    """
+    process = launch_worker(alg_name, alg_dir, socket_path, log_path)
+    wait_worker(alg_name, socket_path, process, log_path, timeout)
+    return process
+
+
+def start_pool(alg_name, alg_dir, pool_dir, size, log_dir, timeout=600):
+    """
+    Starts size workers of an algorithm in pool_dir, which load their models at the same time, and waits until all accept jobs.
+    Returns the (socket, process) of every worker, the output of worker k is written to <log_dir>/worker_<ALGORITHM>_<k>.log.
+    """
+    if not os.path.exists(pool_dir):
+        os.makedirs(pool_dir)
+
+    workers = []
+    try:
+        for k in range(size):
+            socket_path = pool_dir + '/' + f'worker_{k}.sock'
+            workers.append((socket_path, launch_worker(alg_name, alg_dir, socket_path, log_dir + '/' + f'worker_{alg_name}_{k}.log')))
+        for k, (socket_path, process) in enumerate(workers):
+            wait_worker(alg_name, socket_path, process, log_dir + '/' + f'worker_{alg_name}_{k}.log', timeout)
+    except BaseException:
+        stop_pool(workers)
+        raise
+    return workers
+
+
+def stop_worker(socket_path, process, timeout=60):
+    """
+    Asks a worker to shut down and waits for it, kills it if it does not exit in time
+    """
+    try:
+        request(socket_path, {'command': 'shutdown'})
+        process.wait(timeout)
+    except (OSError, RuntimeError, subprocess.TimeoutExpired):
+        process.kill()
+
+
+def stop_pool(workers, timeout=60):
+    """
+    Stops the (socket, process) workers of a pool
+    """
+    for socket_path, process in workers:
+        stop_worker(socket_path, process, timeout)
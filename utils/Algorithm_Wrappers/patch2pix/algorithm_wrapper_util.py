@@ -12,28 +12,23 @@ from utils.eval.model_helper import init_ncn_matcher, init_patch2pix_matcher
 import torch
 import numpy as np
 import time
+from manifest import load_manifest, is_complete, record, file_fingerprint, config_fingerprint, atomic_savez
+from worker import serve
+from pair_index import read_pairs, pair_output_path
+from timing import PairTimer, record_timings
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(
-        description='Algorithm wrapper for Image Matching Evaluation',
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('--alg_dir', type=str)
-    parser.add_argument('--input_dir', type=str)
-    parser.add_argument('--input_pairs', type=str)
-    parser.add_argument('--output_dir', type=str) 
-    parser.add_argument('--resize', type=str)    
-    parser.add_argument('--ratio_th', type=float, default=0.9)
 
-    args_util = parser.parse_args()                    
-    
-    if not os.path.exists(args_util.output_dir):
-        os.makedirs(args_util.output_dir)
-        
+METHOD = 'patch2pix'
+
+
+def load_model(args_util):
+    """
+    Loads the matcher from the pretrained checkpoint, done once per process.
+    Returns the matcher and its arguments.
+    """
     #Borrowed from Patch2Pix's ipnyb      
     os.environ['CUDA_VISIBLE_DEVICES'] = '0'
     
-    METHOD = 'patch2pix'
-    
     if METHOD == 'nc':
         # Initialize ncnet matcher
         args = Namespace(ncn_thres=0.3, imsize=1024, ksize=2,                                   #TODO: what is ncn_thres?
@@ -44,33 +39,81 @@ if __name__ == '__main__':
         args = Namespace(io_thres=0.9, imsize=1024, ksize=2,                                    #TODO: is this ratio threshold?
                           ckpt= args_util.alg_dir + '/pretrained/patch2pix_pretrained.pth')
         matcher = init_patch2pix_matcher(args)
+    return matcher, args
+
+
+def run(args_util, model):
+    """
+    Matches all image pairs of a dataset
+    """
+    matcher, args = model
     
-    with open(args_util.input_pairs) as f:
-        start_time = time.time()
-        for total_pair_number, line in enumerate(f):
-            pairs = line.split(' ')
-            p1_path = args_util.input_dir + '/' + pairs[0]
-            p2_path = args_util.input_dir + '/' + pairs[1]
-                
-            matches, _, _ = matcher(p1_path, p2_path)
-            
-            keypoints0 = matches[:, 0:2]
-            keypoints1 = matches[:, 2:4]
-            
-            mtchs = np.vstack([np.arange(0,matches.shape[0])]*2).T
-            
-            p1 = pairs[0].split('/')[2].split('.')[0]
-            p2 = pairs[1].split('/')[2].split('.')[0]
-                        
-            np.savez_compressed(args_util.output_dir + '/' + p1 + '_' + p2 + '_' + 'matches', 
-                                keypoints0=keypoints0, keypoints1=keypoints1, matches=mtchs)
-            torch.cuda.empty_cache()
+    if not os.path.exists(args_util.output_dir):
+        os.makedirs(args_util.output_dir)
+    
+    # pairs finished with the same configuration and input images are skipped
+    manifest_path = args_util.output_dir + '/' + 'manifest.jsonl'
+    manifest = load_manifest(manifest_path)
+    config = config_fingerprint({'algorithm': METHOD, 'args': vars(args), 'checkpoint': file_fingerprint(args.ckpt)})
+    
+    start_time = time.time()
+    processed_pairs = 0
+    for pair in read_pairs(args_util.input_pairs):
+        output_path = pair_output_path(args_util.output_dir, pair)
+        
+        inputs = file_fingerprint(args_util.input_dir + '/' + pair.image1, args_util.input_dir + '/' + pair.image2)
+        if is_complete(manifest, pair.id, config, inputs, [output_path]):
+            continue
+        
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        
+        timer = PairTimer()
+        
+        p1_path = args_util.input_dir + '/' + pair.image1
+        p2_path = args_util.input_dir + '/' + pair.image2
             
-        end_time = time.time()  
-        total_time = end_time - start_time
-        avg_time = total_time / (total_pair_number+1)
-           
-        print(f'Total Execution Time for Patch2Pix is: {total_time}')
-        print(f'Average Execution Time for Patch2Pix is: {avg_time}') 
+        matches, _, _ = matcher(p1_path, p2_path)
+        
+        keypoints0 = matches[:, 0:2]
+        keypoints1 = matches[:, 2:4]
+        
+        mtchs = np.vstack([np.arange(0,matches.shape[0])]*2).T
+        timer.lap('match')                                                                      # the matcher reads the images itself
+        
+        atomic_savez(output_path, pointsA=keypoints0, pointsB=keypoints1, matches=mtchs)
+        record(manifest_path, pair.id, config, inputs)
+        timer.lap('save')
+        record_timings(args_util.output_dir, pair.id, timer)
+        processed_pairs += 1
+        torch.cuda.empty_cache()
+        
+    end_time = time.time()  
+    total_time = end_time - start_time
+    avg_time = total_time / max(processed_pairs, 1)
+       
+    print(f'Total Execution Time for Patch2Pix is: {total_time}')
+    print(f'Average Execution Time for Patch2Pix is: {avg_time}')
 
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Algorithm wrapper for Image Matching Evaluation',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--alg_dir', type=str)
+    parser.add_argument('--input_dir', type=str)
+    parser.add_argument('--input_pairs', type=str)
+    parser.add_argument('--output_dir', type=str) 
+    parser.add_argument('--resize', type=str)    
+    parser.add_argument('--ratio_th', type=float, default=0.9)
+    parser.add_argument('--serve', type=str, default=None)        # run as a persistent worker on this unix socket
+
+    args_util = parser.parse_args()                    
+    
+    model = load_model(args_util)
     
+    # A worker takes the arguments of this script as jobs and keeps the network loaded between them
+    if args_util.serve:
+        serve(args_util.serve, lambda job: run(parser.parse_args(job), model))
+    else:
+        run(args_util, model)
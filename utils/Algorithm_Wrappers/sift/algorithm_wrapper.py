@@ -9,9 +9,34 @@ Created on Mon Jul 12 01:51:32 2021
 import os
 import argparse
 import numpy as np
+from manifest import load_manifest, is_complete, record, file_fingerprint, config_fingerprint, atomic_savez
+from worker import run_util
+from pair_index import read_pairs, pair_output_path
+from result_store import pack_outputs
+from timing import PairTimer, record_timings, load_timings
 
 
-#First, extract and save the original algorithm's output
+def sweep_config(args):
+    """
+    Fingerprint of the matching settings of a ratio sweep, a sweep made with other settings is not reused
+    """
+    return config_fingerprint({'descriptors': args.descriptor_dtype, 'backend': args.matcher_backend,
+                               'flann': [args.flann_trees, args.flann_checks] if args.approximate else None})
+
+
+def sweep_complete(sweep_outputs, pairs_file, config):
+    """
+    Checks if the ratio sweep outputs of all image pairs exist and were made with the matching settings of config
+    """
+    if not os.path.exists(sweep_outputs + '/' + 'sweep_config'):
+        return False
+    with open(sweep_outputs + '/' + 'sweep_config') as f:
+        if f.read().strip() != config:
+            return False
+    return all(os.path.exists(pair_output_path(sweep_outputs, pair)) for pair in read_pairs(pairs_file))
+
+
+#First, run the algorithm, it writes its outputs in the evaluation format (pointsA, pointsB, matches)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -22,52 +47,84 @@ if __name__ == '__main__':
     parser.add_argument('--dataset_dir', type=str) 
     parser.add_argument('--output_dir', type=str)    
     parser.add_argument('--ratio_th', type=float, default=0.9)
+    parser.add_argument('--feature_dir', type=str, default=None)
+    parser.add_argument('--sweep_dir', type=str, default=None)     # shared by all ratio thresholds of a dataset
+    parser.add_argument('--worker', type=str, default=None)        # pool directory of persistent workers, otherwise conda run
+    parser.add_argument('--workers', type=int, default=1)          # processes of the util matching sequences in parallel
+    parser.add_argument('--match_memory', type=int, default=None)  # MB for the similarities of the util's matcher
+    parser.add_argument('--descriptor_dtype', type=str, default=None)  # float32 by default, float64 for parity checks
+    parser.add_argument('--matcher_backend', type=str, default=None)   # exact matcher backend of the util, auto by default
+    parser.add_argument('--approximate', action='store_true')      # approximate nearest neighbors with FLANN in the util
+    parser.add_argument('--flann_trees', type=int, default=4)
+    parser.add_argument('--flann_checks', type=int, default=32)
 
     args = parser.parse_args()
-      
-    
-    os.system('conda run -n ' + args.alg_name + ' python3 ' + args.alg_dir + '/' + 'algorithm_wrapper_util.py' +
-              ' --alg_dir ' + args.alg_dir + ' --input_dir ' + args.dataset_dir + 
-              ' --input_pairs ' + args.dataset_dir + '/' + 'image_pairs.txt' +
-              ' --output_dir ' + args.output_dir + '/' + 'original_outputs' +
-              ' --ratio_th ' + str(args.ratio_th)) 
-    
-    # os.system('conda run -n ' + alg + ' python3 ' + alg_directory[alg] + '/' + 'algorithm_wrapper_util.py' +
-    #       ' --alg_dir ' + alg_directory[alg] + ' --input_dir ' + dataset_directory[dataset] + 
-    #       ' --input_pairs ' + dataset_directory[dataset]+ '/' + 'image_pairs.txt' +
-    #       ' --output_dir ' + out_dir + '/' + 'original_outputs') 
+
+    # In sweep mode all mutual NN matches are computed once with their ratios, every ratio threshold selects from them.
+    # Otherwise the util writes the final outputs directly.
+    util_output_dir = (args.sweep_dir if args.sweep_dir else args.output_dir) + '/' + 'outputs'
+    run_matcher = not (args.sweep_dir and sweep_complete(util_output_dir, args.dataset_dir + '/' + 'image_pairs.txt', sweep_config(args)))
     
- #Then, read saved outputs and transform to proper format (keypointsA, keypointsB, matches)
+    if run_matcher:
+        util_args = ['--alg_dir', args.alg_dir, '--input_dir', args.dataset_dir,
+                     '--input_pairs', args.dataset_dir + '/' + 'image_pairs.txt',
+                     '--output_dir', util_output_dir]
+        util_args += ['--ratio_sweep'] if args.sweep_dir else ['--ratio_th', args.ratio_th]
+        util_args += ['--feature_dir', args.feature_dir] if args.feature_dir else []
+        util_args += ['--workers', args.workers] if args.workers > 1 else []
+        util_args += ['--match_memory', args.match_memory] if args.match_memory else []
+        util_args += ['--descriptor_dtype', args.descriptor_dtype] if args.descriptor_dtype else []
+        util_args += ['--matcher_backend', args.matcher_backend] if args.matcher_backend else []
+        util_args += ['--approximate', '--flann_trees', args.flann_trees, '--flann_checks', args.flann_checks] if args.approximate else []
+        # the settings of a sweep are stored once it is complete, the util rematches the pairs of a sweep with other settings
+        if args.sweep_dir and os.path.exists(util_output_dir + '/' + 'sweep_config'):
+            os.remove(util_output_dir + '/' + 'sweep_config')
+        run_util(args.alg_name, args.alg_dir, util_args, args.worker)
+        if args.sweep_dir:
+            with open(util_output_dir + '/' + 'sweep_config', 'w') as f:
+                f.write(sweep_config(args))
     
-    pairs_out = os.listdir(args.output_dir  + '/' + 'original_outputs')
+ #Then, select the matches passing this ratio threshold from the sweep
     
-    with open(args.dataset_dir + '/' + 'image_pairs.txt') as f:
-        for line in f:
-            pairs = line.split(' ')
-            subset = pairs[0].split('/')[0]
-            subsubset = pairs[0].split('/')[1]
-            p1 = pairs[0].split('/')[2].split('.')[0]
-            p2 = pairs[1].split('/')[2].split('.')[0]
+    if args.sweep_dir:
+        # pairs selected from the same sweep output with the same ratio threshold are skipped
+        if not os.path.exists(args.output_dir + '/' + 'outputs'):
+            os.makedirs(args.output_dir + '/' + 'outputs')
+        manifest_path = args.output_dir + '/' + 'outputs' + '/' + 'manifest.jsonl'
+        manifest = load_manifest(manifest_path)
+        config = config_fingerprint({'ratio_th': args.ratio_th, 'sweep': True})
+        sweep_timings = load_timings(util_output_dir)
+        
+        for pair in read_pairs(args.dataset_dir + '/' + 'image_pairs.txt'):
+            sweep_path = pair_output_path(util_output_dir, pair)
+            if not os.path.exists(sweep_path):
+                continue
+            
+            output_path = pair_output_path(args.output_dir + '/' + 'outputs', pair)
+            if not os.path.exists(os.path.dirname(output_path)):
+                os.makedirs(os.path.dirname(output_path))
+            
+            inputs = file_fingerprint(sweep_path)
+            if is_complete(manifest, pair.id, config, inputs, [output_path]):
+                continue
             
-            if not os.path.exists(args.output_dir + '/' + 'outputs' + '/' + subset + '/' + subsubset):
-                os.makedirs(args.output_dir + '/' + 'outputs' + '/' + subset + '/' + subsubset)
+            # the stages of the sweep are counted for every threshold selecting from it
+            timer = PairTimer()
+            timer.add(sweep_timings.get(pair.id, {}))
             
-            for k in pairs_out:
-                if p1 in k and p2 in k:
-                    
-                    # Original Algorithm's Output
-                    pair_out = np.load(args.output_dir + '/' + 'original_outputs' + '/' + k)
-                    
-                    keypoints0 = pair_out['keypoints0']
-                    keypoints1 = pair_out['keypoints1']
-                    mtchs = pair_out['matches']
-                    
-                    # Wrapper's Output
-                    pointsA = keypoints0
-                    pointsB = keypoints1
-                    matches = mtchs                
-                    
-                    np.savez_compressed(args.output_dir + '/' + 'outputs' + '/' + subset + '/' + subsubset + 
-                                        '/' + k, pointsA=pointsA, pointsB=pointsB, matches=mtchs)
-                    
-          
+            sweep_out = np.load(sweep_path)
+            mtchs = sweep_out['matches']
+            ratios = sweep_out['ratios']
+            timer.lap('load')
+            
+            keep = ratios <= args.ratio_th
+            timer.lap('match')
+            
+            atomic_savez(output_path, pointsA=sweep_out['pointsA'], pointsB=sweep_out['pointsB'],
+                         matches=mtchs[keep], ratios=ratios[keep])
+            record(manifest_path, pair.id, config, inputs)
+            timer.lap('save')
+            record_timings(args.output_dir + '/' + 'outputs', pair.id, timer)
+
+    # pack the outputs of all pairs into one memory-mapped store for the evaluation
+    pack_outputs(args.output_dir + '/' + 'outputs', read_pairs(args.dataset_dir + '/' + 'image_pairs.txt'), args.output_dir + '/' + 'store')
@@ -10,43 +10,124 @@ import os
 import argparse
 import numpy as np
 import cv2
-import torch
 import time
+from feature_cache import load_or_extract
+from matching import MATCHER_BACKENDS, normalize_descriptors, mnn_ratio_sweep_backend, mnn_ratio_sweep_flann_batch, pinned_backend
+from manifest import load_manifest, is_complete, record, file_fingerprint, config_fingerprint, atomic_savez
+from worker import serve
+from pair_index import read_pairs, pair_output_path
+from timing import PairTimer, record_timings
+from parallel import map_sequences
 
-def mnn_ratio_matcher(descriptors1, descriptors2, ratio=0.8, bidirectional = True):
-    
-    # Mutual NN + symmetric Lowe's ratio test matcher for L2 normalized descriptors.
-    device = descriptors1.device
-    sim = descriptors1 @ descriptors2.t()
 
-    # Retrieve top 2 nearest neighbors 1->2.
-    nns_sim, nns = torch.topk(sim, 2, dim=1)
-    nns_dist = 2 - 2 * nns_sim
-    # Compute Lowe's ratio.
-    ratios12 = nns_dist[:, 0] / (nns_dist[:, 1] + 1e-8)
-    # Save first NN and match similarity.
-    nn12 = nns[:, 0]
-    match_sim = nns_sim[:, 0]
+def load_model(args_util):
+    """
+    Creates the feature detector, done once per process
+    """
+    return cv2.SIFT_create()
+
 
-    # Retrieve top 2 nearest neighbors 1->2.
-    nns_sim, nns = torch.topk(sim.t(), 2, dim=1)
-    nns_dist = 2 - 2 * nns_sim
-    # Compute Lowe's ratio.
-    ratios21 = nns_dist[:, 0] / (nns_dist[:, 1] + 1e-8)
-    # Save first NN.
-    nn21 = nns[:, 0]
+def match_sequence(args_util, sift, pairs):
+    """
+    Matches the image pairs of one reference image and writes their outputs, returns the stage times of every pair.
+    The reference features are extracted once and all pairs are matched with one batched matcher call.
+    """
+    timers = []
+    targets = []
+    for pair in pairs:
+        output_path = pair_output_path(args_util.output_dir, pair)
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        
+        timer = PairTimer()
+        
+        #Load features from the cache or extract them, the reference image is timed with the first pair
+        if not targets:
+            keypoints0, descriptors0 = load_or_extract(sift, args_util.input_dir, pair.image1, args_util.feature_dir, timer)
+        targets.append(load_or_extract(sift, args_util.input_dir, pair.image2, args_util.feature_dir, timer))
+        timers.append(timer)
+    
+    batch_timer = PairTimer()
+    
+    #Normalize descs, one copy each in the descriptor dtype
+    descriptors = [normalize_descriptors(desc, args_util.descriptor_dtype) for desc in [descriptors0] + [descriptors1 for _, descriptors1 in targets]]
     
-    # if not bidirectional, do not use ratios from 2 to 1
-    ratios21[:] *= 1 if bidirectional else 0
+    #Find matches of all pairs, the ratio of every match is stored so that any smaller threshold can be selected later
+    if args_util.approximate:
+        descriptors = [desc.astype(np.float32, copy=False) for desc in descriptors]
+        results = mnn_ratio_sweep_flann_batch(descriptors[0], descriptors[1:], bidirectional = True,
+                                              trees = args_util.flann_trees, checks = args_util.flann_checks)
+    else:
+        results = mnn_ratio_sweep_backend(descriptors[0], descriptors[1:], args_util.matcher_backend, bidirectional = True,
+                                          max_elements = args_util.match_memory * 2**20 // (2 * np.dtype(args_util.descriptor_dtype).itemsize),
+                                          calibration_path = args_util.alg_dir + '/' + 'matcher_calibration.json', pin_path = backend_pin(args_util))
+    batch_timer.lap('match')
+    
+    for pair, timer, (keypoints1, _), (mtchs, _, ratios) in zip(pairs, timers, targets, results):
+        pair_timer = PairTimer()
+        
+        if not args_util.ratio_sweep:
+            mtchs, ratios = mtchs[ratios <= args_util.ratio_th], ratios[ratios <= args_util.ratio_th]
+        pair_timer.lap('match')
+        
+        atomic_savez(pair_output_path(args_util.output_dir, pair), pointsA=keypoints0, pointsB=keypoints1, matches=mtchs, ratios=ratios)
+        pair_timer.lap('save')
         
-    # Mutual NN + symmetric ratio test.
-    ids1 = torch.arange(0, sim.shape[0], device=device)
-    mask = torch.min(ids1 == nn21[nn12], torch.min(ratios12 <= ratio, ratios21[nn12] <= ratio)) # discard ratios21 to get the same results with matlab
-    # Final matches.
-    matches = torch.stack([ids1[mask], nn12[mask]], dim=-1)
-    match_sim = match_sim[mask]
+        # the batched matching is shared equally by the pairs
+        timer.add(pair_timer.times)
+        timer.times['match'] += batch_timer.times['match'] / len(pairs)
+    return timers
+
+
+def backend_pin(args_util):
+    """
+    File of the output directory with the backend 'auto' resolved to for the descriptors, kept for all pairs and resumed runs
+    """
+    return args_util.output_dir + '/' + 'matcher_backend_' + args_util.descriptor_dtype
+
+
+def run(args_util, sift):
+    """
+    Matches all image pairs of a dataset with one ratio threshold
+    """
+    if not os.path.exists(args_util.output_dir):
+        os.makedirs(args_util.output_dir)
+
+    manifest_path = args_util.output_dir + '/' + 'manifest.jsonl'
+    manifest = load_manifest(manifest_path)
+    # the backend that matched the pairs is part of the configuration, 'auto' is pinned by the first matched sequence
+    backend = None if args_util.approximate else args_util.matcher_backend
+    if backend == 'auto':
+        backend = pinned_backend(backend_pin(args_util)) or 'auto'
+    def run_config(backend):
+        return config_fingerprint({'algorithm': 'SIFT', 'opencv': cv2.__version__,
+                                   'descriptors': args_util.descriptor_dtype, 'flann': [args_util.flann_trees, args_util.flann_checks] if args_util.approximate else None,
+                                   'backend': backend, 'ratio_th': 'sweep' if args_util.ratio_sweep else args_util.ratio_th})
+    config = run_config(backend)
+    
+    # pairs finished with the same configuration and input images are skipped
+    pairs = read_pairs(args_util.input_pairs)
+    inputs = {pair.id: file_fingerprint(args_util.input_dir + '/' + pair.image1, args_util.input_dir + '/' + pair.image2) for pair in pairs}
+    todo = [pair for pair in pairs
+            if not is_complete(manifest, pair.id, config, inputs[pair.id], [pair_output_path(args_util.output_dir, pair)])]
+    
+    # the pairs of a sequence share their reference image and are matched together, sequences can run in parallel
+    start_time = time.time()
+    for pair, timer in map_sequences(match_sequence, todo, args_util, sift, load_model, args_util.workers):
+        if backend == 'auto':
+            backend = pinned_backend(backend_pin(args_util))
+            config = run_config(backend)
+        record(manifest_path, pair.id, config, inputs[pair.id])
+        record_timings(args_util.output_dir, pair.id, timer)
+                            
+                            
+    end_time = time.time()  
+    total_time = end_time - start_time
+    avg_time = total_time / max(len(todo), 1)
+       
+    print(f'Total Execution Time for SIFT is: {total_time}')
+    print(f'Average Execution Time for SIFT is: {avg_time}') 
 
-    return (matches.data.cpu().numpy(),match_sim.data.cpu().numpy())
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -57,62 +138,23 @@ if __name__ == '__main__':
     parser.add_argument('--input_pairs', type=str)
     parser.add_argument('--output_dir', type=str)   
     parser.add_argument('--ratio_th', type=float, default=0.9)
+    parser.add_argument('--feature_dir', type=str, default=None)
+    parser.add_argument('--ratio_sweep', action='store_true')     # keep all mutual NN matches and their ratios
+    parser.add_argument('--workers', type=int, default=1)         # processes matching sequences in parallel
+    parser.add_argument('--match_memory', type=int, default=512)  # MB for the similarities of float descriptors (and a transposed copy), larger sets are matched in blocks
+    parser.add_argument('--descriptor_dtype', type=str, default='float32', choices=['float32', 'float64'])  # of the normalized float descriptors
+    parser.add_argument('--matcher_backend', type=str, default='auto', choices=['auto'] + list(MATCHER_BACKENDS))  # auto: the fastest, timed once per problem size
+    parser.add_argument('--approximate', action='store_true')     # approximate nearest neighbors with FLANN instead of the exact matcher
+    parser.add_argument('--flann_trees', type=int, default=4)     # KD-trees (LSH tables for binary descriptors), more find more exact neighbors
+    parser.add_argument('--flann_checks', type=int, default=32)   # leaves searched per descriptor, more find more exact neighbors
+    parser.add_argument('--serve', type=str, default=None)        # run as a persistent worker on this unix socket
 
     args_util = parser.parse_args()                    
     
-    if not os.path.exists(args_util.output_dir):
-        os.makedirs(args_util.output_dir)
-    
-
-    sift = cv2.SIFT_create()
-    
-    with open(args_util.input_pairs) as f:
-        start_time = time.time()
-        for total_pair_number, line in enumerate(f):
-            pairs = line.split(' ')
-            p1_path = args_util.input_dir + '/' + pairs[0]
-            p2_path = args_util.input_dir + '/' + pairs[1]
-            
-            img_A = cv2.imread(p1_path)
-            img_B = cv2.imread(p2_path)
-            
-            keypoints0, descriptors0 = sift.detectAndCompute(cv2.cvtColor(img_A,cv2.COLOR_BGR2GRAY),None)
-            keypoints1, descriptors1 = sift.detectAndCompute(cv2.cvtColor(img_B,cv2.COLOR_BGR2GRAY),None)
-            
-            #Arrange dtype
-            descriptors0 = descriptors0.astype(float)
-            descriptors1 = descriptors1.astype(float)
-
-            #Normalize descs
-            descriptors0 = torch.as_tensor(descriptors0 / np.sqrt((descriptors0*descriptors0).sum(axis=1))[:, np.newaxis])
-            descriptors1 = torch.as_tensor(descriptors1 / np.sqrt((descriptors1*descriptors1).sum(axis=1))[:, np.newaxis])
-            
-            #if torch.cuda.is_available():
-            #    descriptors0 = descriptors0.to('cuda')
-            #    descriptors1 = descriptors1.to('cuda')
-            
-            #Find matches
-            mtchs = mnn_ratio_matcher(descriptors0, descriptors1, ratio=args_util.ratio_th, bidirectional = True)
+    sift = load_model(args_util)
 
-            mtchs = mtchs[0]
-            
-            #Remove GPU memory
-            #torch.cuda.empty_cache()
-            
-            #Convert kpts to numpy array
-            keypoints0 = cv2.KeyPoint_convert(keypoints0)
-            keypoints1 = cv2.KeyPoint_convert(keypoints1)
-            
-            p1 = pairs[0].split('/')[2].split('.')[0]
-            p2 = pairs[1].split('/')[2].split('.')[0]
-                        
-            np.savez_compressed(args_util.output_dir + '/' + p1 + '_' + p2 + '_' + 'matches', 
-                                keypoints0=keypoints0, keypoints1=keypoints1, matches=mtchs)
-                                
-                                
-        end_time = time.time()  
-        total_time = end_time - start_time
-        avg_time = total_time / (total_pair_number+1)
-           
-        print(f'Total Execution Time for SIFT is: {total_time}')
-        print(f'Average Execution Time for SIFT is: {avg_time}') 
+    # A worker takes the arguments of this script as jobs and keeps the detector between them
+    if args_util.serve:
+        serve(args_util.serve, lambda job: run(parser.parse_args(job), sift))
+    else:
+        run(args_util, sift)
@@ -9,9 +9,25 @@ Created on Fri May 21 14:15:00 2021
 import argparse
 import numpy as np
 import pandas as pd
-from PIL import Image
 import cv2
 import os
+import multiprocessing
+from manifest import load_manifest, is_complete, record, file_fingerprint, config_fingerprint, atomic_savez
+from pair_index import pair_output_path
+from dataset_index import load_index
+from homography_cache import HomographyCache, evict
+from homography_estimation import magsac_homography, ransac_homographies, corner_error
+from result_store import open_store, pack_outputs
+from timing import STAGES, load_timings
+
+# raw errors of a pair: sorted reprojection distances of the matches, mean corner error of the estimated homography
+# (inf without one), number of features and RANSAC inliers. MMA and HEA at any pixel threshold are computed from them.
+# With the ratios of the matches in the outputs, their sorted ratios and the distances in that order are kept too, from
+# which the MMA at any (ratio threshold, pixel threshold) follows.
+ERROR_ARRAYS = ['distances', 'corner_error', 'features', 'inliers', 'ratios', 'ratio_distances']
+# homography estimators, MAGSAC of OpenCV pair by pair or the NumPy RANSAC batched over the pairs of a task
+ESTIMATORS = {'magsac': 'USAC_MAGSAC', 'batched': 'batched'}
+BATCH_PAIRS = 64
 
 def eval_matches(p1s, p2s, homography):
     """
@@ -25,113 +41,264 @@ def eval_matches(p1s, p2s, homography):
     dist = np.sqrt(np.sum((p2s - p2s_proj) ** 2, axis=1))               # calculate l2-distance
     return dist
 
-def eval_homography(p1s, p2s, h_gt, im1_path):
+def estimate_homographies(point_pairs, ransac, cache=None):
     """
-    Borrowed from https://github.com/GrumpyZhou/image-matching-toolbox hpatches_helper
-    
-    Estimate the homography between the matches using RANSAC
+    Estimates the homographies between the matched points (p1s, p2s) of several pairs with the ransac parameters
+    [estimator, reprojection threshold, iterations, confidence]. Returns the (homography or None, inliers) of every pair
+    and if it was read from the HomographyCache, only the pairs missing in it are estimated.
     """
-    try:
-        H_pred, inliers = cv2.findHomography(p1s, p2s, cv2.USAC_MAGSAC, ransacReprojThreshold=3, maxIters=5000, confidence=0.9999)
-    except:
-        H_pred = None
-        inliers = np.zeros(0)
+    estimator, threshold, iterations, confidence = ransac
+    keys = [cache.key(p1s, p2s) for p1s, p2s in point_pairs] if cache is not None else []
+    results = [cache.get(key) for key in keys] if cache is not None else [None] * len(point_pairs)
+    cached = [result is not None for result in results]
+    todo = [j for j, result in enumerate(results) if result is None]
     
-    if H_pred is None:
-        correctness = np.zeros(10)
+    if estimator == 'batched':
+        estimates = ransac_homographies([point_pairs[j] for j in todo], threshold, iterations, confidence)
     else:
-        im = Image.open(im1_path)
-        w, h = im.size
-        corners = np.array([[0, 0, 1],
-                            [0, w - 1, 1],
-                            [h - 1, 0, 1],
-                            [h - 1, w - 1, 1]])
-        real_warped_corners = np.dot(corners, np.transpose(h_gt))
-        real_warped_corners = real_warped_corners[:, :2] / real_warped_corners[:, 2:]           # convert back to cartesian coordinates ?
-        warped_corners = np.dot(corners, np.transpose(H_pred))
-        warped_corners = warped_corners[:, :2] / warped_corners[:, 2:]                          # convert back to cartesian coordinates ?
-        mean_dist = np.mean(np.linalg.norm(real_warped_corners - warped_corners, axis=1))
-        correctness = np.array([float(mean_dist <= i) for i in range (1,11)])
-    return correctness, inliers
+        estimates = [magsac_homography(*point_pairs[j], threshold, iterations, confidence) for j in todo]
+    for j, (H_pred, inliers) in zip(todo, estimates):
+        results[j] = H_pred, inliers
+        if cache is not None:
+            cache.put(keys[j], H_pred, inliers)
+    return results, cached
+
+
+def accuracy(errors, thresholds):
+    """
+    Share of the sorted errors at or below every threshold, zeros without errors
+    """
+    if errors.shape[0] == 0:
+        return np.zeros(len(thresholds))
+    return np.searchsorted(errors, thresholds, side='right') / errors.shape[0]
+
+
+def auc(errors, max_threshold):
+    """
+    Exact area under the accuracy curve of the errors from 0 to max_threshold, normalized to 1, 0 without errors
+    """
+    if errors.shape[0] == 0:
+        return 0.0
+    return float(np.mean(np.fmax(0, 1 - errors / max_threshold)))     # an error e adds max_threshold - e to the area, NaN adds nothing
+
+
+def matched_points(outputs):
+    """
+    Coordinates of the matched features of a pair in image A and image B
+    """
+    pointsA = outputs['pointsA']    # coordinates of features in image A
+    pointsB = outputs['pointsB']    # coordinates of features in image B
+    matches = outputs['matches']    # coordinates of matches
+
+    #Load matched points (matches is a matrix of two columns, that contains information about which column of pointsA matches to which column of pointsB ?????)
+    return pointsA[matches[:,0]], pointsB[matches[:,1]]
+
+
+def eval_pair(outputs, h_gt, image_size, homography):
+    """
+    Evaluates the outputs of one pair with the (homography or None, inliers) estimated from its matched points, returns its raw errors
+    """
+    pointsA, pointsB = outputs['pointsA'], outputs['pointsB']
+    pointsA_matched, pointsB_matched = matched_points(outputs)
+    
+    #Calculate distances between ground-truth homography and estimated homography, sorted for the accuracy at any threshold
+    distances = eval_matches(pointsA_matched, pointsB_matched, h_gt)
+
+    #Calculate distances between image projected with ground-truth homography and image projected with estimated homography, image_size is the (width, height) of image1
+    H_pred, inliers = homography
+    mean_dist = corner_error(H_pred, h_gt, image_size)
+    
+    errors = {'distances': np.sort(distances), 'corner_error': np.array([mean_dist]),
+              'features': np.array([(pointsA.shape[0]+pointsB.shape[0])/2]), 'inliers': np.array([np.count_nonzero(inliers)])}
+    if 'ratios' in outputs:
+        order = np.argsort(outputs['ratios'], kind='stable')
+        errors['ratios'] = outputs['ratios'][order]
+        errors['ratio_distances'] = distances[order]
+    return errors
+
+
+def mma_surface(errors, ratio_thresholds, pixel_thresholds):
+    """
+    MMA of a pair for every ratio threshold (rows) and pixel threshold (columns) and its number of matches for every
+    ratio threshold, from the cumulative counts of correct matches in the order of their ratios
+    """
+    ratios = errors['ratios']
+    counts = np.searchsorted(ratios, np.asarray(ratio_thresholds, dtype=ratios.dtype), side='right')   # compared in the dtype of the ratios like the wrappers do
+    correct = np.zeros((ratios.shape[0] + 1, len(pixel_thresholds)))
+    correct[1:] = np.cumsum(errors['ratio_distances'][:, np.newaxis] <= pixel_thresholds, axis=0)
+    return correct[counts] / np.maximum(counts, 1)[:, np.newaxis], counts
+
+
+def result_rows(errors, thresholds):
+    """
+    Rows of a pair in hpatches eval format from its raw errors, [mma1px, mma2px, ... , #features, #matches] and [hom1px, hom2px, ... , #matches, #inliers]
+    """
+    distances = errors['distances']
+    mma = np.around(accuracy(distances, thresholds), 3)     # mma = (number of distances <= threshold) / (number of distances)
+    hom_qual = (errors['corner_error'][0] <= thresholds).astype(float)
+    return (np.hstack((mma, errors['features'][0], distances.shape[0])),
+            np.hstack((hom_qual, distances.shape[0], errors['inliers'][0])))
+
+
+_worker = {}
+
+
+def _init_worker(out_dirs, pairs, ground_truth, ransac, cache_dir, threads):
+    """
+    Pool initializer, keeps the pairs and their ground truth (homographies, sizes of image1), the ransac parameters and the homography cache in the worker
+    """
+    cv2.setNumThreads(threads)
+    _worker['out_dirs'] = out_dirs
+    _worker['pairs'] = pairs
+    _worker['ground_truth'] = ground_truth
+    _worker['ransac'] = ransac
+    _worker['stores'] = {}
+    _worker['cache'] = HomographyCache(cache_dir, {'ransac': ransac, 'opencv': cv2.__version__}) if cache_dir else None
+
+
+def _load_outputs(alg, i, in_store):
+    """
+    Outputs of a pair of an algorithm from its store or its pair file
+    """
+    pair = _worker['pairs'][i]
+    out_dir = _worker['out_dirs'][alg]
+    if in_store:
+        if alg not in _worker['stores']:
+            _worker['stores'][alg] = open_store(os.path.join(out_dir, 'store'))
+        return _worker['stores'][alg][pair.id]
+    return np.load(os.path.join(out_dir, 'outputs', pair.subset, pair.sequence, pair.name))
+
+
+def _eval_task(task):
+    """
+    Evaluates the pairs of a task, a list of (algorithm, pair index, read from the store), with the state of the worker and
+    writes their errors. The homographies of all its pairs are estimated together. Returns the algorithm, the pair index and
+    if the homography was read from the cache for every pair.
+    """
+    outputs = [_load_outputs(alg, i, in_store) for alg, i, in_store in task]
+    homographies, cached = estimate_homographies([matched_points(pair_outputs) for pair_outputs in outputs], _worker['ransac'], _worker['cache'])
+    for (alg, i, _), pair_outputs, homography in zip(task, outputs, homographies):
+        h_gt, image_size = _worker['ground_truth'][0][i], _worker['ground_truth'][1][i]
+        atomic_savez(pair_output_path(os.path.join(_worker['out_dirs'][alg], 'errors'), _worker['pairs'][i]), compressed=False,
+                     **eval_pair(pair_outputs, h_gt, image_size, homography))
+    return [(alg, i, hit) for (alg, i, _), hit in zip(task, cached)]
+
+
+def map_tasks(tasks, out_dirs, pairs, ground_truth, ransac, cache_dir=None, workers=1):
+    """
+    Yields (algorithm, pair index, cache hit) of all tasks in any order once their errors are written. The pairs are evaluated one
+    by one with MAGSAC and in groups of BATCH_PAIRS with the batched estimator. With workers > 1 the pairs of all algorithms are
+    spread over a pool of processes, otherwise they are evaluated in this process.
+    """
+    size = BATCH_PAIRS if ransac[0] == 'batched' else 1
+    groups = [tasks[k:k + size] for k in range(0, len(tasks), size)]
+    if workers <= 1:
+        _init_worker(out_dirs, pairs, ground_truth, ransac, cache_dir, cv2.getNumThreads())
+        for group in groups:
+            yield from _eval_task(group)
+        return
+
+    # spawned workers, a fork after OpenCV started its thread pool can deadlock
+    threads = max(1, os.cpu_count() // workers)
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker, initargs=(out_dirs, pairs, ground_truth, ransac, cache_dir, threads)) as pool:
+        for results in pool.imap_unordered(_eval_task, groups, chunksize=max(1, len(groups) // (8 * workers))):
+            yield from results
 
 
 def main():
     algorithm_results_mma = {}
     algorithm_results_hom = {}
+    algorithm_results_time = {}
+    algorithm_results_auc = {}
+    surfaces = {}
+    # pairs, homographies and image sizes from the index of the dataset, built on first use
+    index = load_index(dataset_dir)
+    pairs = index.pairs    # [path_to_img1 path_to_img2 path_to_homography]
+    ransac = [ESTIMATORS[homography_estimator], 3, ransac_iterations, ransac_confidence]
+    config = config_fingerprint({'ransac': ransac, 'errors': ERROR_ARRAYS})
+    
+    out_dirs = {alg: os.path.join(result_directory, alg) for alg in algorithms}
+    manifest_paths = {alg: os.path.join(out_dirs[alg], 'eval_manifest.jsonl') for alg in algorithms}
+    tasks = []
+    task_inputs = {}
         
-    for i, alg in enumerate(algorithms):
-        out_dir = os.path.join(result_directory, alg)
+    for alg in algorithms:
+        # outputs are read from the packed store of the run if there is one, otherwise from the pair files
+        store = open_store(os.path.join(out_dirs[alg], 'store'))
         
-        all_results_mma = np.empty(shape=[0, 12])
-        all_results_hom = np.empty(shape=[0, 12])
+        # pairs evaluated with the same settings and input files keep their errors
+        manifest = load_manifest(manifest_paths[alg])
         
-        #Enumerate over image_pairs.txt and do evaluation  
-        with open(os.path.join(dataset_dir, 'image_pairs.txt')) as f:
-            for k, line in enumerate(f):
-                pairs = line.split(' ')                 # [path_to_img1 path_to_img2 path_to_homography]
-                subset = pairs[0].split('/')[0]         # "illumination" or "viewpoint"
-                subsubset = pairs[0].split('/')[1]      # image folder name
-                            
-                p1 = pairs[0].split('/')[2].split('.')[0]   # name of first file
-                p2 = pairs[1].split('/')[2].split('.')[0]   # name of second file
-                output_name = p1 + '_' + p2 + '_' + 'matches' + '.npz'
+        #Enumerate over image_pairs.txt, the remaining pairs are evaluated below
+        for i, pair in enumerate(pairs):
+            output_path = os.path.join(out_dirs[alg], 'outputs', pair.subset, pair.sequence, pair.name)
+            errors_path = pair_output_path(os.path.join(out_dirs[alg], 'errors'), pair)
+
+            # a store packed before the pair file was rewritten is not used for that pair
+            in_store = store is not None and pair.id in store
+            if in_store and os.path.exists(output_path):
+                in_store = store.source(pair.id) == file_fingerprint(output_path)
+            if in_store:
+                inputs = store.source(pair.id) + ',' + index.key
+            else:
+                inputs = file_fingerprint(output_path) + ',' + index.key
+            if is_complete(manifest, pair.name, config, inputs, [errors_path]):
+                continue
             
-                #Load output points and matches
-                outputs = np.load(os.path.join(out_dir, 'outputs', subset, subsubset, output_name))
+            if not os.path.exists(os.path.dirname(errors_path)):
+                os.makedirs(os.path.dirname(errors_path))
+            tasks.append((alg, i, in_store))
+            task_inputs[alg, i] = inputs
+    
+    # groundtruth homographies and sizes of image1, the workers get a copy instead of the memory map
+    ground_truth = (np.array(index.homographies), np.array(index.image_sizes[:, 0]))
+    
+    cache_hits = 0
+    for alg, i, cache_hit in map_tasks(tasks, out_dirs, pairs, ground_truth, ransac, ransac_cache, workers):
+        record(manifest_paths[alg], pairs[i].name, config, task_inputs[alg, i])
+        cache_hits += cache_hit
+    
+    # the least recently used homographies beyond the size limit are removed
+    if ransac_cache:
+        evict(ransac_cache, ransac_cache_size * 2**20)
+        print(f'Homographies of {cache_hits} of {len(tasks)} evaluated pairs read from {ransac_cache}')
+    
+    # number of results for illumination or viewpoint
+    num_illumination = index.count('illumination')
+    # num_viewpoint = index.count('viewpoint')
+    subsets = [slice(None, num_illumination), slice(num_illumination, None), slice(None)]
+    
+    for alg in algorithms:
+        out_dir = out_dirs[alg]
+        
+        # the raw errors of all pairs are packed into one memory-mapped store, the results at the pixel thresholds are computed from it
+        pack_outputs(os.path.join(out_dir, 'errors'), pairs, os.path.join(out_dir, 'errors_store'), ERROR_ARRAYS)
+        errors = open_store(os.path.join(out_dir, 'errors_store'))
+        pair_errors = [errors[pair.id] for pair in pairs]
+        rows = [result_rows(pair_error, pixel_thresholds) for pair_error in pair_errors]
+        all_results_mma = np.array([row_mma for row_mma, _ in rows])
+        all_results_hom = np.array([row_hom for _, row_hom in rows])
+        
+        # exact AUCs of the MMA (mean over pairs) and the HEA up to every auc threshold for illumination, viewpoint and overall
+        corner_errors = np.array([pair_error['corner_error'][0] for pair_error in pair_errors])
+        algorithm_results_auc[alg] = [value for subset in subsets for threshold in auc_thresholds
+                                      for value in [np.mean([auc(pair_error['distances'], threshold) for pair_error in pair_errors[subset]]),
+                                                    auc(np.sort(corner_errors[subset]), threshold)]]
+        
+        # mean MMA and number of matches of illumination, viewpoint and all pairs at every ratio and pixel threshold, if the outputs have ratios
+        if ratio_thresholds is not None and 'ratios' in errors.arrays:
+            pair_surfaces = [mma_surface(pair_error, ratio_thresholds, pixel_thresholds) for pair_error in pair_errors]
+            mma = np.array([surface for surface, _ in pair_surfaces])
+            counts = np.array([count for _, count in pair_surfaces])
+            surfaces[alg] = (np.array([np.mean(mma[subset], 0) for subset in subsets]), np.array([np.mean(counts[subset], 0) for subset in subsets]))
+        elif ratio_thresholds is not None:
+            print(f'The outputs of {alg} have no ratios, it is left out of the MMA surface')
         
-                pointsA = outputs['pointsA']    # coordinates of features in image A
-                pointsB = outputs['pointsB']    # coordinates of features in image B
-                matches = outputs['matches']    # coordinates of matches
-                
-                #Load groundtruth homographies
-                h_name = pairs[2].split('/')[2].split('\n')[0]                                      # homography name from image_pairs
-                h_gt = np.loadtxt(os.path.join(dataset_dir, subset, subsubset, h_name))             # load homography
-                im1_path = os.path.join(dataset_dir, subset, subsubset, p1 + '.ppm')                # path of image1
-
-                #Load matched points (matches is a matrix of two columns, that contains information about which column of pointsA matches to which column of pointsB ?????)
-                pointsA_matched = pointsA[matches[:,0]]
-                pointsB_matched = pointsB[matches[:,1]]
-                
-                #Calculate distances between ground-truth homography and estimated homography
-                distances = eval_matches(pointsA_matched, pointsB_matched, h_gt)
-                
-                if distances.shape[0] >= 1:
-                    mma = np.around(np.array([np.count_nonzero(distances <= i)/distances.shape[0] for i in range (1,11)]),3)    # mma = (number of distances <= threshold) / (number of distances)
-                                                                                                                                # threshold = 1px - 11px
-                else:
-                    mma = np.zeros(10)
-
-                #Calculate distances between image projected with ground-truth homography and image projected with estimated homography
-                hom_qual, inliers = eval_homography(pointsA_matched, pointsB_matched, h_gt, im1_path)
-                
-                if inliers.shape[0] > 0:
-                    number_of_inliers = sum(inliers > 0)[0]
-                else:
-                    number_of_inliers = 0
-                
-                # Write the results in hpatches eval format(0-10px mma, #features / #matches)
-                results_mma = np.hstack((mma,(pointsA.shape[0]+pointsB.shape[0])/2,matches.shape[0]))   # [mma1px, mma2px, ... , #features, #matches]
-                all_results_mma = np.vstack((all_results_mma,results_mma))                              # append all results from different images into array
-
-                # Write the results in hpatches eval format(0-10px hom_qual, #matches / #inliers)
-                results_hom = np.hstack((hom_qual, matches.shape[0], number_of_inliers))    # [hom1px, hom2px, ... , #matches, #inliers]
-                all_results_hom = np.vstack((all_results_hom,results_hom))                  # append all results from different images into array
-
-
         #Write all_results_mma for each algorithms as csv    
         np.savetxt(out_dir + '_mma' + ".csv", all_results_mma, delimiter=",")
         np.savetxt(out_dir + '_hom' + ".csv", all_results_hom, delimiter=",")
 
-        # number of results for illumination or viewpoint
-        num_illumination = 0
-        # num_viewpoint = 0
-        with open(os.path.join(dataset_dir, 'image_pairs.txt')) as f:
-            for line in f:
-                if line.startswith('illumination'):
-                    num_illumination += 1 
-                # if line.startswith('viewpoint'):
-                #     num_viewpoint += 1
-
         # calculate mean results for illumination, viewpoint and overall
         mean_illumination_mma = np.mean(all_results_mma[ : num_illumination, : ], 0)
         mean_viewpoint_mma = np.mean(all_results_mma[num_illumination : , : ], 0)
@@ -143,16 +310,18 @@ def main():
         mean_all_hom = np.mean(all_results_hom,0)
         algorithm_results_hom[alg] = np.hstack([mean_illumination_hom, mean_viewpoint_hom, mean_all_hom])
 
-    # create headers for csv file
-    header1 = ['','', '', '', '', 'Illumination All', '', '', '', '', '', '', 
-                '', '', '', '', '', 'Viewpoint All', '', '', '', '', '', '',
-                '', '', '', '', '', 'All Results', '', '', '', '', '', '']
-    header2_mma = ['1px','2px','3px','4px','5px','6px','7px','8px','9px','10px','#Features','#Matches',
-                '1px','2px','3px','4px','5px','6px','7px','8px','9px','10px','#Features','#Matches',
-                '1px','2px','3px','4px','5px','6px','7px','8px','9px','10px','#Features','#Matches']
-    header2_hom = ['1px','2px','3px','4px','5px','6px','7px','8px','9px','10px','#Matches','#Inliers',
-                '1px','2px','3px','4px','5px','6px','7px','8px','9px','10px','#Matches','#Inliers',
-                '1px','2px','3px','4px','5px','6px','7px','8px','9px','10px','#Matches','#Inliers']
+        # mean stage times per pair in seconds, from the timings the wrappers write next to the outputs
+        timings = load_timings(os.path.join(out_dir, 'outputs'))
+        pair_times = np.array([[timings[pair.id][stage] for stage in STAGES + ['total']] for pair in pairs if pair.id in timings])
+        if pair_times.shape[0] > 0:
+            algorithm_results_time[alg] = np.hstack([np.mean(pair_times, 0), pair_times.shape[0]])
+
+    # create headers for csv file, one block of columns for illumination, viewpoint and all results
+    labels = [f'{threshold:g}px' for threshold in pixel_thresholds]
+    block = len(labels) + 2
+    header1 = [label if j == block // 2 - 1 else '' for label in ['Illumination All', 'Viewpoint All', 'All Results'] for j in range(block)]
+    header2_mma = (labels + ['#Features','#Matches']) * 3
+    header2_hom = (labels + ['#Matches','#Inliers']) * 3
     headers_mma = pd.MultiIndex.from_arrays([header1, header2_mma], names=['Algorithms', ''])
     headers_hom = pd.MultiIndex.from_arrays([header1, header2_hom], names=['Algorithms', ''])
 
@@ -164,6 +333,23 @@ def main():
     df_mma.to_csv(os.path.join(result_directory, 'overall_results_mma.csv'), float_format='%.2f')
     df_hom.to_csv(os.path.join(result_directory, 'overall_results_hom.csv'), float_format='%.2f')
 
+    header1_auc = [label if j == 0 else '' for label in ['Illumination All', 'Viewpoint All', 'All Results'] for j in range(2 * len(auc_thresholds))]
+    header2_auc = [f'{metric}@{threshold:g}px' for threshold in auc_thresholds for metric in ['MMA', 'HEA']] * 3
+    df_auc = pd.DataFrame.from_dict(algorithm_results_auc, orient='index', columns=pd.MultiIndex.from_arrays([header1_auc, header2_auc], names=['Algorithms', '']))
+    df_auc.to_csv(os.path.join(result_directory, 'overall_results_auc.csv'), float_format='%.3f')
+
+    # the MMA surface of all algorithms as one array file
+    if surfaces:
+        np.savez(os.path.join(result_directory, 'mma_surface.npz'), algorithms=np.array(list(surfaces)), subsets=np.array(['illumination', 'viewpoint', 'all']),
+                 ratio_thresholds=np.array(ratio_thresholds), pixel_thresholds=pixel_thresholds,
+                 mma=np.array([mma for mma, _ in surfaces.values()]), matches=np.array([counts for _, counts in surfaces.values()]))
+
+    if algorithm_results_time:
+        df_time = pd.DataFrame.from_dict(algorithm_results_time, orient='index', columns=[stage + ' [s]' for stage in STAGES + ['total']] + ['#Pairs'])
+        df_time.index.name = 'Algorithms'
+        df_time['#Pairs'] = df_time['#Pairs'].astype(int)
+        df_time.to_csv(os.path.join(result_directory, 'overall_results_time.csv'), float_format='%.4f')
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -172,10 +358,28 @@ if __name__ == '__main__':
     parser.add_argument('--algorithms', '--algorithms', nargs='+', default=[])
     parser.add_argument('--result_directory', type=str)
     parser.add_argument('--dataset_dir', type=str) 
+    parser.add_argument('--workers', type=int, default=1)     # processes evaluating the pairs of all algorithms in parallel
+    parser.add_argument('--pixel_thresholds', nargs='+', type=float, default=list(range(1, 11)))  # of the MMA and HEA, from the stored errors without evaluating again
+    parser.add_argument('--auc_thresholds', nargs='+', type=float, default=[3, 5, 10])           # of the exact MMA and HEA AUCs
+    parser.add_argument('--ratio_thresholds', nargs='+', type=float, default=None)  # MMA surface over these and the pixel thresholds, from outputs with the ratios of all matches (e.g. of a ratio sweep)
+    parser.add_argument('--ransac_cache', type=str, default=None)          # directory of estimated homographies keyed by the matched points, shared by runs
+    parser.add_argument('--ransac_cache_size', type=int, default=1024)     # MB, least recently used homographies beyond it are removed
+    parser.add_argument('--homography_estimator', type=str, default='magsac', choices=list(ESTIMATORS))   # batched: NumPy RANSAC over many pairs and hypotheses at once
+    parser.add_argument('--ransac_iterations', type=int, default=5000)     # iteration budget of the estimator per pair
+    parser.add_argument('--ransac_confidence', type=float, default=0.9999) # a pair stops early once its best hypothesis reached it
 
     args = parser.parse_args()
     algorithms = args.algorithms
     result_directory = args.result_directory
     dataset_dir = args.dataset_dir
+    workers = args.workers
+    pixel_thresholds = np.array(args.pixel_thresholds)
+    auc_thresholds = args.auc_thresholds
+    ratio_thresholds = args.ratio_thresholds
+    ransac_cache = args.ransac_cache
+    ransac_cache_size = args.ransac_cache_size
+    homography_estimator = args.homography_estimator
+    ransac_iterations = args.ransac_iterations
+    ransac_confidence = args.ransac_confidence
     
     main()
\ No newline at end of file
@@ -8,6 +8,7 @@ Created on Fri May 21 14:15:00 2021
 
 import os
 import shutil
+from dataset_index import build_index
 
 original_name = 'hpatches-sequences-release'
 new_name = 'hpatches'
@@ -43,4 +44,6 @@ with open (new_name + '/' 'image_pairs.txt' , 'a') as f:
                                 new_name + '/' + subset + '/' + subsubset + '/' +  subsubset + '_' + ind)
                     pair_to_write = [subset + '/' + subsubset + '/' +  subsubset + '_' + ind for ind in pair]
                 f.write(pair_to_write[0] + ' ' + pair_to_write[1] + ' ' + pair_to_write[2] + '\n')
-                        
+
+# index the pairs with their homographies and image sizes, the noisy variants of the dataset copy it
+build_index(new_name)
@@ -7,6 +7,10 @@ from skimage.util import random_noise
 from skimage import io
 from skimage.color import rgb2gray
 import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Algorithm_Wrappers', 'common'))
+from dataset_index import INDEX_DIR, build_index
 
 def args_to_dict(arguments):
     """
@@ -72,6 +76,10 @@ def main():
     # create list of all files with defined extension
     imagelist = recursive_copy(dataset_dir, noisy_dataset_dir, ext=file_extensions)
 
+    # the index of the original is not kept, it is built again for the noisy images below
+    if os.path.exists(os.path.join(noisy_dataset_dir, INDEX_DIR)):
+        shutil.rmtree(os.path.join(noisy_dataset_dir, INDEX_DIR))
+
     # save information about noise to textfile
     kwargs_str = "\n".join(f"{key}: {value}" for key, value in kwargs.items())
     with open(os.path.join(noisy_dataset_dir, 'noise.txt'), 'w') as f:
@@ -106,6 +114,10 @@ def main():
         # save image
         io.imsave(img_dest, image)
 
+    # index of the pairs, homographies and image sizes for eval.py
+    if os.path.exists(os.path.join(noisy_dataset_dir, 'image_pairs.txt')):
+        build_index(noisy_dataset_dir)
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
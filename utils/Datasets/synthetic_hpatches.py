@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generates an HPatches-style dataset of any size from a folder of seed images, without network access.
+
+Every sequence is one seed image at a random resolution and N-1 transformed copies, written as
+<subset>/<sequence>/<sequence>_k.ppm with the ground truth <sequence>_H_1_k and listed in image_pairs.txt
+like the output of hpatches_organizer.py. Illumination sequences change only the photometry (identity
+homography), viewpoint sequences apply random homographies growing with k and mild photometric changes.
+Without a seed folder, procedural texture images are used.
+"""
+
+import os
+import argparse
+import numpy as np
+import cv2
+from multiprocessing import Pool
+
+SUBSETS = {'illumination': 'i', 'viewpoint': 'v'}
+
+
+def procedural_image(rng, width, height):
+    """
+    Textured gray image with shapes and blurred noise at several scales, so detectors find corners and blobs
+    """
+    image = np.zeros((height, width), dtype=np.float32)
+    for scale in [4, 16, 64]:
+        noise = rng.uniform(0, 1, (height // scale + 1, width // scale + 1)).astype(np.float32)
+        image += cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)[:height, :width] * scale
+    image = 255 * (image - image.min()) / (image.max() - image.min())
+
+    for _ in range(rng.integers(60, 150)):
+        color = int(rng.integers(0, 256))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(5, max(6, min(width, height) // 6)))
+        if rng.uniform() < 0.5:
+            cv2.rectangle(image, (x, y), (x + size, y + int(rng.integers(5, size + 1))), color, -1)
+        else:
+            cv2.circle(image, (x, y), size // 2, color, -1)
+    return cv2.cvtColor(image.astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+
+def seed_image(seed_path, rng, width, height):
+    """
+    Seed image resized and center-cropped to width x height, a procedural image if there is no seed path
+    """
+    if seed_path is None:
+        return procedural_image(rng, width, height)
+
+    image = cv2.imread(seed_path, cv2.IMREAD_COLOR)
+    scale = max(width / image.shape[1], height / image.shape[0])
+    image = cv2.resize(image, (int(np.ceil(image.shape[1] * scale)), int(np.ceil(image.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    x, y = (image.shape[1] - width) // 2, (image.shape[0] - height) // 2
+    return image[y:y + height, x:x + width]
+
+
+def random_homography(rng, width, height, strength):
+    """
+    Homography moving every image corner randomly by up to strength times the image size
+    """
+    corners = np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+    shift = rng.uniform(-strength, strength, (4, 2)) * [width, height]
+    return cv2.getPerspectiveTransform(corners, np.float32(corners + shift))
+
+
+def photometric_change(rng, image, strength):
+    """
+    Random gain, gamma, bias, color balance and sensor noise, all scaled by strength
+    """
+    gain = np.exp(rng.uniform(-1, 1) * strength)
+    gamma = np.exp(rng.uniform(-1, 1) * strength / 2)
+    bias = rng.uniform(-1, 1) * strength * 0.15
+    color = 1 + rng.uniform(-1, 1, 3) * strength * 0.2
+    sigma = rng.uniform(0, strength * 0.02)
+
+    image = (image / 255.0) ** gamma * gain * color + bias
+    image += rng.normal(0, sigma, image.shape)
+    return np.uint8(np.clip(255 * image, 0, 255))
+
+
+def generate_sequence(task):
+    """
+    Writes the images and homographies of one sequence, a sequence that was already written completely is skipped.
+    Returns the lines of image_pairs.txt of the sequence.
+    """
+    output_dir, subset, sequence, seed_path, width, height, num_images, max_shift, max_photometric, seed = task
+    sequence_dir = output_dir + '/' + subset + '/' + sequence
+    lines = [f'{subset}/{sequence}/{sequence}_1.ppm {subset}/{sequence}/{sequence}_{k}.ppm {subset}/{sequence}/{sequence}_H_1_{k}\n'
+             for k in range(2, num_images + 1)]
+
+    # the last homography is written last
+    if os.path.exists(sequence_dir + '/' + f'{sequence}_H_1_{num_images}'):
+        return lines
+    if not os.path.exists(sequence_dir):
+        os.makedirs(sequence_dir)
+
+    rng = np.random.default_rng(seed)
+    reference = seed_image(seed_path, rng, width, height)
+    cv2.imwrite(sequence_dir + '/' + f'{sequence}_1.ppm', reference)
+
+    for k in range(2, num_images + 1):
+        difficulty = (k - 1) / (num_images - 1)
+        if subset == 'viewpoint':
+            homography = random_homography(rng, width, height, max_shift * difficulty)
+            image = cv2.warpPerspective(reference, homography, (width, height))
+            image = photometric_change(rng, image, 0.1 * max_photometric)
+        else:
+            homography = np.eye(3)
+            image = photometric_change(rng, reference, max_photometric * difficulty)
+
+        cv2.imwrite(sequence_dir + '/' + f'{sequence}_{k}.ppm', image)
+        np.savetxt(sequence_dir + '/' + f'{sequence}_H_1_{k}', homography)
+    return lines
+
+
+def generate_dataset(output_dir, num_sequences, seed_dir=None, resolutions=((640, 480),), num_images=6,
+                     max_shift=0.15, max_photometric=0.6, seed=0, workers=1):
+    """
+    Generates num_sequences sequences per subset in output_dir and writes image_pairs.txt.
+    Returns the number of image pairs.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    seed_paths = [None]
+    if seed_dir:
+        seed_paths = sorted(seed_dir + '/' + name for name in os.listdir(seed_dir) if cv2.haveImageReader(seed_dir + '/' + name))
+        if not seed_paths:
+            raise ValueError(f'no readable images in {seed_dir}')
+
+    # every sequence has its own random stream, so the dataset does not depend on the number of workers
+    tasks = []
+    for s, (subset, prefix) in enumerate(SUBSETS.items()):
+        for n in range(num_sequences):
+            rng = np.random.default_rng([seed, s, n])
+            width, height = resolutions[rng.integers(len(resolutions))]
+            seed_path = seed_paths[rng.integers(len(seed_paths))]
+            tasks.append((output_dir, subset, f'{prefix}_syn{n:05d}', seed_path, width, height, num_images,
+                          max_shift, max_photometric, [seed, s, n, 1]))
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            lines = pool.map(generate_sequence, tasks, chunksize=16)
+    else:
+        lines = [generate_sequence(task) for task in tasks]
+
+    with open(output_dir + '/' + 'image_pairs.txt', 'w') as f:
+        for sequence_lines in lines:
+            f.writelines(sequence_lines)
+    return sum(len(sequence_lines) for sequence_lines in lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generates a synthetic dataset in the HPatches evaluation layout',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--output_dir', type=str)
+    parser.add_argument('--seed_dir', type=str, default=None)                   # folder of seed images, procedural images if not given
+    parser.add_argument('--sequences', type=int, default=100)                   # sequences per subset
+    parser.add_argument('--images', type=int, default=6)                        # images per sequence, the first is the reference
+    parser.add_argument('--resolutions', nargs='+', default=['640x480'])        # WIDTHxHEIGHT, one is drawn per sequence
+    parser.add_argument('--max_shift', type=float, default=0.15)                # corner shift of the hardest viewpoint change, relative to the image size
+    parser.add_argument('--max_photometric', type=float, default=0.6)           # strength of the hardest illumination change
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    args = parser.parse_args()
+    resolutions = [tuple(int(size) for size in resolution.split('x')) for resolution in args.resolutions]
+
+    num_pairs = generate_dataset(args.output_dir, args.sequences, args.seed_dir, resolutions, args.images,
+                                 args.max_shift, args.max_photometric, args.seed, args.workers)
+    print(f'{num_pairs} image pairs written to {args.output_dir}')
@@ -18,8 +18,8 @@ def read_results(filename: str):
         for line in csv_reader:
             alg = line[0]
             res_illumination[alg] = [float(line[i+1]) for i, value in enumerate(pixel_thresholds)]
-            res_viewpoint[alg] = [float(line[i+13]) for i, value in enumerate(pixel_thresholds)]
-            res_all[alg] = [float(line[i+25]) for i, value in enumerate(pixel_thresholds)]
+            res_viewpoint[alg] = [float(line[i+num_thresholds+3]) for i, value in enumerate(pixel_thresholds)]
+            res_all[alg] = [float(line[i+2*num_thresholds+5]) for i, value in enumerate(pixel_thresholds)]
     return res_illumination, res_viewpoint, res_all, pixel_thresholds
 
 def calculate_auc(data: list):